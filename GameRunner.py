@@ -1,22 +1,27 @@
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 from Games.Game import Game, Player
 from Models.Model import Model
 import time
 
 class GameRunnerComparisonResult:
-    def __init__(self, winner: Optional[Player], average_first_player_turn_time: float, average_second_player_turn_time: float, total_time: float):
+    def __init__(self, winner: Optional[Player], first_player_turn_times: List[float], second_player_turn_times: List[float], total_time: float):
         self.winner = winner
-        self.average_first_player_turn_time = average_first_player_turn_time
-        self.average_second_player_turn_time = average_second_player_turn_time
+        # The time each turn of each player took, in order
+        self.first_player_turn_times = first_player_turn_times
+        self.second_player_turn_times = second_player_turn_times
+        self.average_first_player_turn_time = sum(first_player_turn_times) / len(first_player_turn_times)
+        self.average_second_player_turn_time = sum(second_player_turn_times) / len(second_player_turn_times)
         self.total_time = total_time
 
 class GameRunner:
 
-    def __init__(self, game: Game, player_one: Model, player_two: Model):
+    def __init__(self, game: Game, player_one: Model, player_two: Model, time_control: Optional[float] = None):
         # Creates a GameRunner where the two models play the given game
+        # With a time_control, every move is an anytime search of that many seconds, so models are compared at equal wall-clock cost
         self.game = game
         self.player_one = player_one
         self.player_two = player_two
+        self.time_control = time_control
         self.player_one.set_game_and_player(game, Player.FIRST)
         self.player_two.set_game_and_player(game, Player.SECOND)
         self.active = True
@@ -30,21 +35,31 @@ class GameRunner:
         while not self.game.is_game_over():
             current = self.game.get_current_player()
             if current == Player.FIRST:
-                self.player_one.take_move()
+                self.take_turn(self.player_one)
             else:
-                self.player_two.take_move()
+                self.take_turn(self.player_two)
             if show: print(self.game.get_description())
+        self.stop_pondering()
         return self.game.get_winner()
 
+    def take_turn(self, model: Model):
+        if self.time_control is None:
+            model.take_move()
+        else:
+            model.take_move_within(self.time_control)
+
+    def stop_pondering(self):
+        # A model whose opponent made the last move may still be pondering
+        self.player_one.stop_pondering()
+        self.player_two.stop_pondering()
+
     def compare_once(self) -> GameRunnerComparisonResult:
         assert self.active
         self.active = False
 
         # Stats:
-        num_first_player_turns = 0
-        total_first_player_turn_time = 0.0
-        num_second_player_turns = 0
-        total_second_player_turn_time = 0.0
+        first_player_turn_times = []
+        second_player_turn_times = []
 
         assert self.game.get_opponent_move() is None
         assert not self.game.is_game_over()
@@ -55,25 +70,24 @@ class GameRunner:
             current = self.game.get_current_player()
             if current == Player.FIRST:
                 start = time.time()
-                self.player_one.take_move()
+                self.take_turn(self.player_one)
                 end = time.time()
-                num_first_player_turns += 1
-                total_first_player_turn_time += (end - start)
+                first_player_turn_times.append(end - start)
             else:
                 start = time.time()
-                self.player_two.take_move()
+                self.take_turn(self.player_two)
                 end = time.time()
-                num_second_player_turns += 1
-                total_second_player_turn_time += (end - start)
+                second_player_turn_times.append(end - start)
         winner = self.game.get_winner()
+        self.stop_pondering()
 
         game_end = time.time()
 
-        assert num_first_player_turns > 0 and num_second_player_turns > 0
+        assert len(first_player_turn_times) > 0 and len(second_player_turn_times) > 0
 
         return GameRunnerComparisonResult(
             winner,
-            total_first_player_turn_time / num_first_player_turns,
-            total_second_player_turn_time / num_second_player_turns,
+            first_player_turn_times,
+            second_player_turn_times,
             game_end - game_start
         )
@@ -2,12 +2,15 @@ from GameSelectionGUI import GameSelectionGUI
 from ConnectFourGUI import ConnectFourGUI
 
 from Games.Game import Player
-from Games.ConnectFour import ConnectFour
+from Games.ConnectFourBitboard import ConnectFourBitboard
 
 from Models.HumanModel import HumanModel
 from Models.Minimax import Minimax
 from Models.MCTS import MCTS
+from Models.AlphaZero.AlphaZeroModel import AlphaZeroModel
+from Models.AlphaZero.AlphaZeroConfig import connectfour_config
 
+import dataclasses
 import threading
 import queue
 
@@ -61,6 +64,7 @@ class GameRunnerGUI:
                             break
                     self.next_turn()
             else:
+                self.player_two.stop_pondering()
                 if self.game.get_winner() == Player.FIRST:
                     self.game_view.display_win("You win!")
                 else:
@@ -77,7 +81,7 @@ class GameRunnerGUI:
 
     def select_game(self, game: str):
         if game == "Connect4":
-            self.game = ConnectFour()
+            self.game = ConnectFourBitboard(incremental_score=True)
             self.game_view = ConnectFourGUI(self)
         elif game == "Chess":
             return
@@ -88,7 +92,10 @@ class GameRunnerGUI:
         if game == "Minimax":
             self.player_two = Minimax()
         elif game == "MCTS":
-            self.player_two = MCTS()
+            # Pondering searches while the human thinks, so the reply to their move is almost instant
+            self.player_two = MCTS(ponder=True)
+        elif game == "AlphaZero":
+            self.player_two = AlphaZeroModel(dataclasses.replace(connectfour_config, ponder=True, count_reused_visits=True))
 
         self.main_menu.close_window()
         self.start_game_gui()
@@ -97,7 +104,7 @@ class GameRunnerGUI:
         return ["Connect4", "Chess"]
 
     def get_opponents(self):
-        return ["Minimax", "MCTS"]
+        return ["Minimax", "MCTS", "AlphaZero"]
 
     def start_game_gui(self):
         # Use threading to allow background process (game loop and move computation) and GUI to run at the same time
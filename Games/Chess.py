@@ -1,5 +1,6 @@
 from typing import Any, Optional, List
 import chess
+import chess.polyglot
 
 from Games.Game import Game, Player, Move
 
@@ -11,6 +12,15 @@ class ChessMove(Move):
     def get_description(self) -> str:
         return self.move.uci()
 
+    def __eq__(self, other):
+        return isinstance(other, ChessMove) and self.move == other.move
+
+    def __hash__(self):
+        return hash(self.move)
+
+    def __repr__(self):
+        return f"ChessMove({self.move.uci()})"
+
 PIECE_VALUES = {
     chess.PAWN: 1,
     chess.KNIGHT: 3,
@@ -20,10 +30,37 @@ PIECE_VALUES = {
     chess.KING: 0
 }
 
+# Zobrist keys, laid out like the polyglot opening book format
+ZOBRIST_KEYS = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+CASTLING_MASKS = (chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8)
+
+def piece_key(square: chess.Square, piece: chess.Piece) -> int:
+    return ZOBRIST_KEYS[64 * ((piece.piece_type - 1) * 2 + int(piece.color)) + square]
+
+def state_key(board: chess.Board) -> int:
+    # The part of the hash that does not depend on piece placement: castling rights, en passant and turn
+    key = 0
+    for i, mask in enumerate(CASTLING_MASKS):
+        if board.castling_rights & mask:
+            key ^= ZOBRIST_KEYS[768 + i]
+    if board.ep_square is not None:
+        key ^= ZOBRIST_KEYS[772 + chess.square_file(board.ep_square)]
+    if board.turn == chess.WHITE:
+        key ^= ZOBRIST_KEYS[780]
+    return key
+
+def zobrist_hash(board: chess.Board) -> int:
+    key = state_key(board)
+    for square, piece in board.piece_map().items():
+        key ^= piece_key(square, piece)
+    return key
+
 class Chess(Game):
 
     def __init__(self, board: chess.Board = None):
         self.board = board if board is not None else chess.Board()
+        self.hash = zobrist_hash(self.board)
+        self.previous_hashes: List[int] = []
 
     def get_winner(self) -> Optional[Player]:
         if self.board.outcome() is None: return None
@@ -50,10 +87,35 @@ class Chess(Game):
         assert False
 
     def perform_move(self, move: ChessMove) -> None:
-        self.board.push(move.move)
+        # Update the hash incrementally: remove the pieces on the squares the move changes, then add them back after it
+        board = self.board
+        squares = [move.move.from_square, move.move.to_square]
+        if board.is_castling(move.move):
+            # The king and rook can come from and go to anywhere on the back rank (in Chess960)
+            rank = chess.square_rank(move.move.from_square)
+            squares = [chess.square(file, rank) for file in range(8)]
+        elif board.is_en_passant(move.move):
+            squares.append(chess.square(chess.square_file(move.move.to_square), chess.square_rank(move.move.from_square)))
+
+        key = self.hash ^ state_key(board)
+        for square in squares:
+            piece = board.piece_at(square)
+            if piece is not None: key ^= piece_key(square, piece)
+        board.push(move.move)
+        for square in squares:
+            piece = board.piece_at(square)
+            if piece is not None: key ^= piece_key(square, piece)
+
+        self.previous_hashes.append(self.hash)
+        self.hash = key ^ state_key(board)
+
+    def get_hash(self) -> int:
+        return self.hash
 
     def get_copy(self) -> Any:
-        return Chess(self.board.copy())
+        copy = Chess(self.board.copy())
+        copy.previous_hashes = self.previous_hashes[:]
+        return copy
 
     def is_game_over(self) -> bool:
         return self.board.outcome() is not None
@@ -79,6 +141,7 @@ class Chess(Game):
 
     def undo_move(self) -> None:
         self.board.pop()
+        self.hash = self.previous_hashes.pop()
 
     def get_neural_net_description_of_state(self) -> Any:
         pass
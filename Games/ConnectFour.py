@@ -1,5 +1,6 @@
 from typing import Any, List, Optional
 import copy
+import random
 import numpy as np
 import torch
 
@@ -32,13 +33,100 @@ CONNECT_THREE = 5
 CONNECT_TWO = 2
 OPPONENT_THREE = -4
 
+def window_score(piece_count: int, empty_count: int, opp_count: int) -> int:
+    # Scores a window of 4 from the point of view of the player owning piece_count of it
+    score = 0
+
+    # Prioritise a winning move
+    # Minimax makes this less important
+    if piece_count == 4:
+        score += WIN_SCORE
+    # Make connecting 3 second priority
+    elif piece_count == 3 and empty_count == 1:
+        score += CONNECT_THREE
+    # Make connecting 2 third priority
+    elif piece_count == 2 and empty_count == 2:
+        score += CONNECT_TWO
+    # Prioritise blocking an opponent's winning move (but not over bot winning)
+    # Minimax makes this less important
+    if opp_count == 3 and empty_count == 1:
+        score += OPPONENT_THREE
+
+    return score
+
+def get_windows() -> List[List[tuple]]:
+    # Returns the (row, col) cells of every window of 4, in the same order score_position visits them
+    windows = []
+    for r in range(NUM_ROWS):
+        for c in range(NUM_COLUMNS - 3):
+            windows.append([(r, c + i) for i in range(WINDOW_LENGTH)])
+    for c in range(NUM_COLUMNS):
+        for r in range(NUM_ROWS - 3):
+            windows.append([(r + i, c) for i in range(WINDOW_LENGTH)])
+    for r in range(NUM_ROWS - 3):
+        for c in range(NUM_COLUMNS - 3):
+            windows.append([(r + i, c + i) for i in range(WINDOW_LENGTH)])
+    for r in range(NUM_ROWS - 3):
+        for c in range(NUM_COLUMNS - 3):
+            windows.append([(r + 3 - i, c + i) for i in range(WINDOW_LENGTH)])
+    return windows
+
+WINDOWS = get_windows()
+# CELL_WINDOWS[row][col] lists the indices of the windows (at most 16) that contain the cell
+CELL_WINDOWS = [[[] for _ in range(NUM_COLUMNS)] for _ in range(NUM_ROWS)]
+for window_index, window in enumerate(WINDOWS):
+    for r, c in window:
+        CELL_WINDOWS[r][c].append(window_index)
+# WINDOW_SCORES[own][opp] is window_score for a window holding own pieces of a player and opp of the opponent
+WINDOW_SCORES = [
+    [window_score(own, WINDOW_LENGTH - own - opp, opp) if own + opp <= WINDOW_LENGTH else 0 for opp in range(WINDOW_LENGTH + 1)]
+    for own in range(WINDOW_LENGTH + 1)
+]
+
+# Zobrist keys: ZOBRIST_KEYS[player][row][col] is xored into the hash when player has a piece at (row, col)
+# The player to move follows from the number of pieces, so it needs no key of its own
+_zobrist_random = random.Random(4)
+ZOBRIST_KEYS = [
+    [[_zobrist_random.getrandbits(64) for _ in range(NUM_COLUMNS)] for _ in range(NUM_ROWS)]
+    for _ in Player
+]
+# The keys of the mirror image, so mirrored_hash is the hash the position would have with its columns reversed
+MIRRORED_ZOBRIST_KEYS = [[row[::-1] for row in player_keys] for player_keys in ZOBRIST_KEYS]
+
 class ConnectFour(Game):
     
-    def __init__(self):
+    def __init__(self, incremental_score: bool = False):
         self.previous_moves: List[ConnectFourMove] = []
         self.board = np.full((NUM_ROWS, NUM_COLUMNS), EMPTY)
         self.current_player = Player.FIRST
         self.movesMade = 0
+        self.hash = 0
+        self.mirrored_hash = 0
+        self.reset_score_tracking(incremental_score)
+
+    def reset_score_tracking(self, incremental_score: bool):
+        # With incremental scoring, the piece counts of every window and the score_position of both players
+        # are kept up to date in perform_move/undo_move, so score_position is a constant-time lookup
+        self.incremental_score = incremental_score
+        self.window_counts = [[0] * len(WINDOWS), [0] * len(WINDOWS)] # Indexed by Player.value, then window
+        self.scores = [0, 0] # Indexed by Player.value, before the sign flip for the second player
+
+    def update_score(self, row: int, col: int, player: Player, delta: int):
+        # Adds (delta = +1) or removes (delta = -1) a piece of player at (row, col) from the running scores
+        own_counts = self.window_counts[player.value]
+        opp_counts = self.window_counts[1 - player.value]
+        own_score = 0
+        opp_score = 0
+        for window_index in CELL_WINDOWS[row][col]:
+            own = own_counts[window_index]
+            opp = opp_counts[window_index]
+            own_counts[window_index] = own + delta
+            own_score += WINDOW_SCORES[own + delta][opp] - WINDOW_SCORES[own][opp]
+            opp_score += WINDOW_SCORES[opp][own + delta] - WINDOW_SCORES[opp][own]
+        if col == NUM_COLUMNS // 2:
+            own_score += delta * CENTER_MULTIPLIER
+        self.scores[player.value] += own_score
+        self.scores[1 - player.value] += opp_score
 
     def is_game_over(self):    
         # Check if no more moves can be made
@@ -55,10 +143,15 @@ class ConnectFour(Game):
     # https://github.com/kupshah/Connect-Four/blob/master/board.py
     def score_position(self, player: Player) -> int:
         # Score the board positions for the current player
+        if self.incremental_score:
+            score = self.scores[player.value]
+            return -score if player == Player.SECOND else score
+
         score = 0
+        board = self.board
 
         # Place greater importance on moves in the center column
-        center_array = self.board[:, NUM_COLUMNS // 2]
+        center_array = board[:, NUM_COLUMNS // 2]
         center_count = np.sum(center_array == player.value)
         score += center_count * 3
 
@@ -66,36 +159,34 @@ class ConnectFour(Game):
         for r in range(NUM_ROWS):
             for c in range(NUM_COLUMNS - 3):
                 # Create a horizontal window of 4
-                window = self.board[r, c:c + WINDOW_LENGTH]
+                window = board[r, c:c + WINDOW_LENGTH]
                 score += self.evaluate_window(window, player)
     
         # Score vertical positions
         for c in range(NUM_COLUMNS):
             for r in range(NUM_ROWS - 3): # 
                 # Create a vertical window of 4
-                window = self.board[r:r + WINDOW_LENGTH, c]
+                window = board[r:r + WINDOW_LENGTH, c]
                 score += self.evaluate_window(window, player)
     
         # Score positive diagonals
         for r in range(NUM_ROWS - 3):
             for c in range(NUM_COLUMNS - 3):
                 # Create a positive diagonal window of 4
-                window = np.array([self.board[r + i][c + i] for i in range(WINDOW_LENGTH)])
+                window = np.array([board[r + i][c + i] for i in range(WINDOW_LENGTH)])
                 score += self.evaluate_window(window, player)
     
         # Score negative diagonals
         for r in range(NUM_ROWS - 3):
             for c in range(NUM_COLUMNS - 3):
                 # Create a negative diagonal window of 4
-                window = np.array([self.board[r + 3 - i][c + i] for i in range(WINDOW_LENGTH)])
+                window = np.array([board[r + 3 - i][c + i] for i in range(WINDOW_LENGTH)])
                 score += self.evaluate_window(window, player)
         if player == Player.SECOND:
             score *= -1
         return score
 
     def evaluate_window(self, window, player: Player):
-        score = 0
-
         # Switch scoring based on turn
         opp_piece = Player.FIRST
         if player == Player.FIRST:
@@ -105,22 +196,7 @@ class ConnectFour(Game):
         empty_count = np.sum(window == EMPTY)
         opp_count = np.sum(window == opp_piece.value)
 
-        # Prioritise a winning move
-        # Minimax makes this less important
-        if piece_count == 4:
-            score += WIN_SCORE
-        # Make connecting 3 second priority
-        elif piece_count == 3 and empty_count == 1:
-            score += CONNECT_THREE
-        # Make connecting 2 third priority
-        elif piece_count == 2 and empty_count == 2:
-            score += CONNECT_TWO
-        # Prioritise blocking an opponent's winning move (but not over bot winning)
-        # Minimax makes this less important
-        if opp_count == 3 and empty_count == 1:
-            score += OPPONENT_THREE
-
-        return score
+        return window_score(piece_count, empty_count, opp_count)
 
     def get_window_winner(self, window) -> Optional[Player]:
         if np.sum(window == Player.FIRST.value) == 4: return Player.FIRST
@@ -188,6 +264,10 @@ class ConnectFour(Game):
         for row in range(NUM_ROWS - 1, -1, -1):
             if self.board[row][col] == EMPTY:
                 self.board[row][col] = self.current_player.value
+                self.hash ^= ZOBRIST_KEYS[self.current_player.value][row][col]
+                self.mirrored_hash ^= MIRRORED_ZOBRIST_KEYS[self.current_player.value][row][col]
+                if self.incremental_score:
+                    self.update_score(row, col, self.current_player, +1)
                 self.movesMade += 1
                 self.previous_moves.append(move)
                 self.current_player = Player.SECOND if self.current_player == Player.FIRST else Player.FIRST
@@ -201,16 +281,23 @@ class ConnectFour(Game):
         if len(self.previous_moves) == 0: return None
         return self.previous_moves[-1]
 
+    def get_hash(self) -> int:
+        return self.hash
+
+    def get_mirrored_hash(self) -> Optional[int]:
+        return self.mirrored_hash
+
     def get_copy(self) -> Any:
         return copy.deepcopy(self)
 
     def get_display_text(self):
+        board = self.board
         board_str = ""
         for row in range(NUM_ROWS):
             for col in range(NUM_COLUMNS):
                 if col != EMPTY:
                     board_str += '|'
-                slot = self.board[row][col] if self.board[row][col] != EMPTY else " "
+                slot = board[row][col] if board[row][col] != EMPTY else " "
                 board_str += f" {slot} "
             board_str += '\n'
             if row != NUM_ROWS - 1:
@@ -227,6 +314,10 @@ class ConnectFour(Game):
                 expected = 0 if self.current_player == Player.FIRST else 1
                 assert self.board[row][move.column] == expected
                 self.board[row][move.column] = EMPTY
+                self.hash ^= ZOBRIST_KEYS[self.current_player.value][row][move.column]
+                self.mirrored_hash ^= MIRRORED_ZOBRIST_KEYS[self.current_player.value][row][move.column]
+                if self.incremental_score:
+                    self.update_score(row, move.column, self.current_player, -1)
                 return
         assert False
     
@@ -237,12 +328,16 @@ class ConnectFour(Game):
         return [Player.FIRST.value, Player.SECOND.value, EMPTY]
     
     def get_neural_net_description_of_state(self) -> Any:
+        board = self.board
         encoded_state = np.stack(
-            (self.board == Player.FIRST.value, self.board == Player.SECOND.value, self.board == EMPTY) # 3 layers
+            (board == Player.FIRST.value, board == Player.SECOND.value, board == EMPTY) # 3 layers
         ).astype(np.float32)
 
         return encoded_state
 
+    def is_mirror_symmetric(self) -> bool:
+        return True
+
     def get_move_by_index(self, index: int) -> Move:
         return ConnectFourMove(index)
     
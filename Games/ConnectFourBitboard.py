@@ -0,0 +1,226 @@
+import random
+from typing import Any, List, Optional
+import numpy as np
+
+from Games.Game import Player, Move
+from Games.ConnectFour import ConnectFour, ConnectFourMove, EMPTY, NUM_ROWS, NUM_COLUMNS, ZOBRIST_KEYS, MIRRORED_ZOBRIST_KEYS
+
+# Each column takes NUM_ROWS + 1 bits: one per row (bottom row first) plus an empty
+# sentinel bit on top, so shifting by a whole column never wraps into the next one
+COLUMN_HEIGHT = NUM_ROWS + 1
+NUM_BITS = NUM_COLUMNS * COLUMN_HEIGHT
+
+# Bit shifts that move one step along a line: vertical, horizontal, and both diagonals
+DIRECTIONS = (1, COLUMN_HEIGHT, COLUMN_HEIGHT - 1, COLUMN_HEIGHT + 1)
+
+# Moves are immutable, so every position can share the same move objects
+MOVES = [ConnectFourMove(col) for col in range(NUM_COLUMNS)]
+
+def has_four(bitboard: int) -> bool:
+    # Shift-and-mask check for four pieces in a row in any direction
+    for shift in DIRECTIONS:
+        pairs = bitboard & (bitboard >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+def has_four_batch(bitboards: np.ndarray) -> np.ndarray:
+    # has_four for every bitboard in a uint64 array
+    found = np.zeros(len(bitboards), dtype=bool)
+    for shift in DIRECTIONS:
+        pairs = bitboards & (bitboards >> np.uint64(shift))
+        found |= (pairs & (pairs >> np.uint64(2 * shift))) != 0
+    return found
+
+def bitboard_to_array(bitboard: int) -> np.ndarray:
+    # Unpacks a bitboard into a boolean 6x7 array in the same layout as ConnectFour.board
+    bits = np.unpackbits(np.array([bitboard], dtype="<u8").view(np.uint8), bitorder="little")
+    columns = bits[:NUM_BITS].reshape(NUM_COLUMNS, COLUMN_HEIGHT)[:, :NUM_ROWS]
+    return columns.T[::-1].astype(bool)
+
+# A ConnectFour implementation that stores the board as two 64-bit bitboards (one per player)
+# plus the height of each column, so moves are O(1) and the winner is known as soon as a move is made.
+# It is a drop-in replacement for ConnectFour: `board` is still available as a 6x7 array, built on demand.
+class ConnectFourBitboard(ConnectFour):
+
+    def __init__(self, incremental_score: bool = False):
+        self.previous_moves: List[ConnectFourMove] = []
+        self.bitboards = [0, 0] # Indexed by Player.value
+        self.heights = [0] * NUM_COLUMNS
+        self.current_player = Player.FIRST
+        self.movesMade = 0
+        # winners[i] is the winner after the first i + 1 moves, so undo_move can just pop it
+        self.winners: List[Optional[Player]] = []
+        self.hash = 0
+        self.mirrored_hash = 0
+        self.reset_score_tracking(incremental_score)
+
+    @property
+    def board(self) -> np.ndarray:
+        board = np.full((NUM_ROWS, NUM_COLUMNS), EMPTY)
+        board[bitboard_to_array(self.bitboards[Player.FIRST.value])] = Player.FIRST.value
+        board[bitboard_to_array(self.bitboards[Player.SECOND.value])] = Player.SECOND.value
+        return board
+
+    def is_game_over(self) -> bool:
+        return self.movesMade == NUM_COLUMNS * NUM_ROWS or self.get_winner() is not None
+
+    def get_winner(self) -> Optional[Player]:
+        if len(self.winners) == 0: return None
+        return self.winners[-1]
+
+    def get_possible_moves(self) -> List[ConnectFourMove]:
+        if self.is_game_over(): return []
+        return [MOVES[col] for col in range(NUM_COLUMNS) if self.heights[col] < NUM_ROWS]
+
+    def perform_move(self, move: ConnectFourMove) -> bool:
+        assert move.column >= 0 and move.column < NUM_COLUMNS
+
+        col = move.column
+        height = self.heights[col]
+        if height == NUM_ROWS:
+            return False
+        player = self.current_player
+        bitboard = self.bitboards[player.value] | (1 << (col * COLUMN_HEIGHT + height))
+        self.bitboards[player.value] = bitboard
+        self.heights[col] = height + 1
+        self.hash ^= ZOBRIST_KEYS[player.value][NUM_ROWS - 1 - height][col]
+        self.mirrored_hash ^= MIRRORED_ZOBRIST_KEYS[player.value][NUM_ROWS - 1 - height][col]
+        if self.incremental_score:
+            self.update_score(NUM_ROWS - 1 - height, col, player, +1)
+        self.movesMade += 1
+        self.previous_moves.append(move)
+        # The game stops at the first four in a row, so a new four must include the disc just placed
+        winner = self.get_winner()
+        if winner is None and has_four(bitboard):
+            winner = player
+        self.winners.append(winner)
+        self.current_player = Player.SECOND if player == Player.FIRST else Player.FIRST
+        return True
+
+    def undo_move(self):
+        assert(len(self.previous_moves) > 0)
+        move = self.previous_moves.pop()
+        self.winners.pop()
+        self.current_player = Player.FIRST if self.current_player == Player.SECOND else Player.SECOND
+        self.movesMade -= 1
+        col = move.column
+        self.heights[col] -= 1
+        bit = 1 << (col * COLUMN_HEIGHT + self.heights[col])
+        assert self.bitboards[self.current_player.value] & bit
+        self.bitboards[self.current_player.value] ^= bit
+        self.hash ^= ZOBRIST_KEYS[self.current_player.value][NUM_ROWS - 1 - self.heights[col]][col]
+        self.mirrored_hash ^= MIRRORED_ZOBRIST_KEYS[self.current_player.value][NUM_ROWS - 1 - self.heights[col]][col]
+        if self.incremental_score:
+            self.update_score(NUM_ROWS - 1 - self.heights[col], col, self.current_player, -1)
+
+    def get_copy(self) -> Any:
+        copy = ConnectFourBitboard.__new__(ConnectFourBitboard)
+        copy.previous_moves = self.previous_moves[:]
+        copy.bitboards = self.bitboards[:]
+        copy.heights = self.heights[:]
+        copy.current_player = self.current_player
+        copy.movesMade = self.movesMade
+        copy.winners = self.winners[:]
+        copy.hash = self.hash
+        copy.mirrored_hash = self.mirrored_hash
+        copy.incremental_score = self.incremental_score
+        copy.window_counts = [counts[:] for counts in self.window_counts]
+        copy.scores = self.scores[:]
+        return copy
+
+    def get_neural_net_description_of_state(self) -> Any:
+        first = bitboard_to_array(self.bitboards[Player.FIRST.value])
+        second = bitboard_to_array(self.bitboards[Player.SECOND.value])
+        encoded_state = np.stack(
+            (first, second, ~(first | second)) # 3 layers
+        ).astype(np.float32)
+
+        return encoded_state
+
+    def get_move_by_index(self, index: int) -> Move:
+        return MOVES[index]
+
+    def random_playouts(self, count: int) -> List[Optional[Player]]:
+        # Plays count random games to the end from the current position at once, with the boards of all of them held in NumPy arrays
+        # Every unfinished playout drops a piece each step (the same player moves in all of them), so this takes at most one step per empty cell
+        # Returns the winner of each playout (None for a draw), leaving the game unchanged
+        if self.is_game_over():
+            return [self.get_winner()] * count
+        bitboards = np.array([[self.bitboards[player.value]] * count for player in Player], dtype=np.uint64)
+        heights = np.tile(np.array(self.heights), (count, 1))
+        winners = np.full(count, -1)
+        playing = np.arange(count)
+        player = self.current_player.value
+        while len(playing) > 0:
+            legal = heights[playing] < NUM_ROWS
+            # Playouts with no legal moves are draws
+            not_full = legal.any(axis=1)
+            playing, legal = playing[not_full], legal[not_full]
+            if len(playing) == 0: break
+            # A uniformly random legal column: the legal column with the highest random number
+            columns = np.where(legal, np.random.random(legal.shape), -1.0).argmax(axis=1)
+            rows = heights[playing, columns]
+            bitboards[player, playing] |= np.left_shift(np.uint64(1), (columns * COLUMN_HEIGHT + rows).astype(np.uint64))
+            heights[playing, columns] = rows + 1
+            won = has_four_batch(bitboards[player, playing])
+            winners[playing[won]] = player
+            playing = playing[~won]
+            player = 1 - player
+        players = [Player.FIRST, Player.SECOND]
+        return [players[winner] if winner >= 0 else None for winner in winners]
+
+def check_parity(num_games: int = 200, seed: int = 0):
+    # Plays num_games random games on ConnectFourBitboard and the array-backed ConnectFour side by side, including undo and copies,
+    # and raises AssertionError at the first difference between them
+    rng = random.Random(seed)
+    for game_index in range(num_games):
+        reference = ConnectFour()
+        bitboard = ConnectFourBitboard(incremental_score=(game_index % 2 == 0))
+        while True:
+            assert reference.get_winner() == bitboard.get_winner()
+            assert reference.is_game_over() == bitboard.is_game_over()
+            assert reference.get_possible_moves() == bitboard.get_possible_moves()
+            assert np.array_equal(reference.board, bitboard.board)
+            assert np.array_equal(reference.get_neural_net_description_of_state(), bitboard.get_neural_net_description_of_state())
+            assert reference.get_heuristic() == bitboard.get_heuristic()
+            assert reference.get_value_and_terminated() == bitboard.get_value_and_terminated()
+            assert reference.get_description() == bitboard.get_description()
+            assert reference.get_hash() == bitboard.get_hash()
+            assert reference.get_mirrored_hash() == bitboard.get_mirrored_hash()
+            moves = reference.get_possible_moves()
+            if len(moves) == 0: break
+            move = rng.choice(moves)
+            # Try a move and take it back before committing to it
+            reference.perform_move(move)
+            bitboard.perform_move(move)
+            assert reference.get_winner() == bitboard.get_winner()
+            reference.undo_move()
+            bitboard.undo_move()
+            assert np.array_equal(reference.board, bitboard.board)
+            # Copies must not share state with the original
+            copy = bitboard.get_copy()
+            copy.perform_move(move)
+            assert np.array_equal(reference.board, bitboard.board)
+            reference.perform_move(move)
+            bitboard.perform_move(move)
+
+if __name__ == "__main__":
+    import time
+
+    check_parity()
+    print("ConnectFourBitboard matches ConnectFour on 200 random games")
+
+    # Time the operations the search models call at every node
+    for game_class in (ConnectFour, ConnectFourBitboard):
+        random.seed(0)
+        start = time.time()
+        nodes = 0
+        for _game in range(100):
+            game = game_class()
+            while not game.is_game_over():
+                game.get_winner()
+                game.perform_move(random.choice(game.get_possible_moves()))
+                nodes += 1
+        elapsed = time.time() - start
+        print(f"{game_class.__name__}: {nodes / elapsed:.0f} moves/second")
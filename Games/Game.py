@@ -1,4 +1,5 @@
 
+import random
 from abc import ABC, abstractmethod
 from enum import Enum
 from typing import Any, TypeVar, List, Optional
@@ -100,6 +101,25 @@ class Game(ABC):
         # returns true if the string is valid and the move was successful
         pass
 
+    def get_hash(self) -> int:
+        # returns a hash of the current position, equal for equal positions however they were reached
+        # games should override this with a Zobrist hash kept up to date in perform_move/undo_move
+        return hash((self.get_description(), self.get_current_player()))
+
+    def random_playouts(self, count: int) -> List[Optional[Player]]:
+        # plays count games of random moves to the end from the current position, leaving it unchanged
+        # returns the winner of each (None for a tie); games that can play many at once faster should override this
+        return [random_playout(self) for _ in range(count)]
+
+    def get_mirrored_hash(self) -> Optional[int]:
+        # returns get_hash of the position mirrored left to right, or None if the game does not track it
+        return None
+
+    def is_mirror_symmetric(self) -> bool:
+        # returns true if mirroring the board left to right gives an equivalent position,
+        # with the last axis of get_neural_net_description_of_state reversed and the order of the action indices reversed
+        return False
+
     @abstractmethod
     def get_copy(self) -> "Game":
         # returns a copy of self
@@ -125,3 +145,17 @@ class Game(ABC):
     def get_action_size(self):
         # returns the total number of moves that could be taken
         pass
+
+
+def random_playout(game: Game) -> Optional[Player]:
+    # Plays random moves until the game is over, then undoes them and returns the winner
+    undo_count = 0
+    while not game.is_game_over():
+        moves = game.get_possible_moves()
+        move = random.choice(moves)
+        undo_count += 1
+        game.perform_move(move)
+    winner = game.get_winner()
+    for _ in range(undo_count):
+        game.undo_move()
+    return winner
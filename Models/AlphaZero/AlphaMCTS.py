@@ -1,18 +1,24 @@
 # Alpha Zero (complete): https://www.youtube.com/watch?v=wuSQpLinRB4
-from typing import Dict
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 import math
+import threading
+import time
 import numpy as np
 import torch
 
 from Games.Game import Game, Player, Move
 from Models.AlphaZero.AlphaZeroConfig import AlphaZeroConfig
 from Models.AlphaZero.ResNet import ResNet
+from Models.AlphaZero.EvaluationCache import EvaluationCache, CacheKey
+from Models.AlphaZero.InferenceServer import InferenceServer
 
+# A node only stores the move that leads to it: the position itself is reached by replaying the moves from the root on a scratch game
 class MCTSNode:
-    def __init__(self, game_state: Game, args: AlphaZeroConfig, action_taken: int=None, parent: "MCTSNode"=None, prior: float=0):
-        self.game_state = game_state
+    def __init__(self, args: AlphaZeroConfig, player: Player, move: Move=None, action_taken: int=None, parent: "MCTSNode"=None, prior: float=0):
         self.args = args
+        self.player = player # The player to move in this node's position
         self.parent = parent
+        self.move = move
         self.action_taken = action_taken
         self.prior = prior
         
@@ -35,17 +41,18 @@ class MCTSNode:
             q_value = 0
         else:
             q_value = child.value_sum / child.visit_count
-            if child.game_state.get_current_player() == Player.FIRST:
+            if child.player == Player.FIRST:
                 q_value = -q_value
         return q_value + self.args.exploration_weight * (math.sqrt(self.visit_count) / (child.visit_count + 1)) * child.prior
 
-    def expand(self, policy):
+    def expand(self, policy, game: Game, possible_moves: List[Move]):
+        # possible_moves are the moves in this node's position, game maps action indices to moves
+        possible_moves = set(possible_moves)
+        child_player = Player.SECOND if self.player == Player.FIRST else Player.FIRST
         for action_taken, prob in enumerate(policy):
-            move = self.game_state.get_move_by_index(action_taken)
-            if move in self.game_state.get_possible_moves():
-                child_state = self.game_state.get_copy()
-                child_state.perform_move(move)
-                child = MCTSNode(child_state, self.args, action_taken, self, prob)
+            move = game.get_move_by_index(action_taken)
+            if move in possible_moves:
+                child = MCTSNode(self.args, child_player, move, action_taken, self, prob)
                 self.children[move] = child
 
     def update(self, value):
@@ -53,61 +60,202 @@ class MCTSNode:
         self.visit_count += 1
 
 class AlphaMCTS():
-    def __init__(self, game: Game, model: ResNet, args: AlphaZeroConfig):
+
+    # Pondering stops after this many simulations if the opponent is still thinking, to bound the tree's memory
+    MAX_PONDER_SIMULATIONS = 20_000
+
+    def __init__(self, game: Game, model: ResNet, args: AlphaZeroConfig, cache: Optional[EvaluationCache] = None, server: Optional[InferenceServer] = None):
+        # cache can be shared between searches; by default each search has its own if args.evaluation_cache_size > 0
+        # With a server, positions are evaluated by the server's model (which must be model) together with those of other searches
         self.game = game
         self.model = model
         self.args = args
-        self.root = MCTSNode(game, args)
+        self.server = server
+        if cache is None and args.evaluation_cache_size > 0:
+            cache = EvaluationCache(args.evaluation_cache_size, args.mirror_inference)
+        self.cache = cache
+        self.root: Optional[MCTSNode] = None
+        # The game the search replays moves on, a copy of the root's position
+        self.scratch: Game = None
+        # Statistics about the most recent search
+        self.stats: Dict[str, float] = {}
+        # The most visited move of the running search_until
+        self.best_move: Optional[Move] = None
+        self.ponder_thread: Optional[threading.Thread] = None
+        self.ponder_stop_requested = False
 
     def take_move(self):
+        self.stop_pondering()
         opp_move = self.game.get_opponent_move()
         if opp_move:
-            if opp_move in self.root.children.keys():
-                self.root = self.root.children[opp_move]
-            else:
-                self.root = MCTSNode(self.game, self.args)
+            self.advance_root(opp_move)
         action_probs = self.search(self.game)
+        self.play_best_move(action_probs)
+
+    async def take_move_async(self):
+        # take_move, letting other coroutines run while the server evaluates positions
+        self.stop_pondering()
+        opp_move = self.game.get_opponent_move()
+        if opp_move:
+            self.advance_root(opp_move)
+        action_probs = await self.search_async(self.game)
+        self.play_best_move(action_probs)
+
+    def play_best_move(self, action_probs: np.ndarray):
         action_index = np.argmax(action_probs)
-        move = self.game.get_move_by_index(action_index)
+        self.play_move(self.game.get_move_by_index(action_index))
+
+    def play_move(self, move: Move):
         self.game.perform_move(move)
-        self.root = self.root.children[move]
-    
-    def search(self, game_state) -> Move:
-        self.root = MCTSNode(game_state, self.args)
-        
-        for _search in range(self.args.num_searches):
-            node = self.root
-
-            # Selection
-            while node.is_fully_expanded():
-                node = node.best_child()
-            
-            value = 0
-            if node.game_state.is_game_over(): # Is terminal node
-                winner = node.game_state.get_winner()
-                if winner == Player.FIRST:
-                    value = 10000
-                elif winner == Player.SECOND:
-                    value = -10000
-            else:
-                policy, value = self.model(
-                    torch.tensor(node.game_state.get_neural_net_description_of_state(), device=self.model.device).unsqueeze(0)
-                )
-                policy = torch.softmax(policy, axis=1).squeeze(0).detach().cpu().flatten().numpy()
+        self.advance_root(move)
+        if self.args.ponder:
+            self.start_pondering()
+
+    def start_pondering(self):
+        # Keeps running simulations from the root (the position after this player's move) in a background thread, until stop_pondering()
+        # The simulations replay moves on the scratch game only, so the opponent can move on the game meanwhile
+        # The next search reuses the subtree of the opponent's move (see count_reused_visits)
+        if self.ponder_thread is not None or self.root is None or self.scratch.is_game_over(): return
+        self.ponder_stop_requested = False
+        self.ponder_thread = threading.Thread(target=self.run_ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def run_ponder(self):
+        if self.cache is not None:
+            self.cache.check_model(self.model)
+        simulations = 0
+        while not self.ponder_stop_requested and simulations < self.MAX_PONDER_SIMULATIONS:
+            simulations += self.run_round()
+
+    def stop_pondering(self):
+        if self.ponder_thread is None: return
+        self.ponder_stop_requested = True
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    def advance_root(self, move: Move):
+        # Makes the child reached by move the new root, so the next search continues from its subtree
+        # The rest of the tree is released
+        child = self.root.children.get(move) if self.root is not None else None
+        if child is None or not self.args.reuse_tree:
+            self.root = None
+            return
+        child.parent = None
+        self.root = child
+        self.scratch.perform_move(move)
+
+    def search(self, game_state) -> np.ndarray:
+        return self.run_steps(self.search_steps(game_state))
+
+    def run_steps(self, steps: Generator[List[np.ndarray], Tuple[np.ndarray, np.ndarray], Any]) -> Any:
+        # Drives a search generator to the end with synchronous evaluation, returns its return value
+        try:
+            states = next(steps)
+            while True:
+                states = steps.send(self.evaluate(states))
+        except StopIteration as stop:
+            return stop.value
+
+    def search_until(self, game_state, should_stop: Callable[[], bool]) -> Optional[Move]:
+        # Anytime search: runs simulations (search_batch_size at a time) until should_stop() returns True, always running at least one round
+        # best_move is kept up to date after every round, so it can be read from another thread while the search runs
+        # Returns the most visited move
+        self.start_search(game_state)
+        start = time.time()
+        self.best_move = None
+        simulations = 0
+        while simulations == 0 or not should_stop():
+            simulations += self.run_round()
+            self.best_move = self.game.get_move_by_index(int(np.argmax(self.action_probs())))
+        elapsed = time.time() - start
+        self.stats["simulations"] = simulations
+        self.stats["simulations_per_second"] = simulations / elapsed if elapsed > 0 else 0.0
+        self.record_cache_stats()
+        return self.best_move
+
+    async def search_async(self, game_state) -> np.ndarray:
+        steps = self.search_steps(game_state)
+        try:
+            states = next(steps)
+            while True:
+                states = steps.send(await self.evaluate_async(states))
+        except StopIteration as stop:
+            return stop.value
+
+    def run_round(self) -> int:
+        # Runs search_batch_size simulations from the root with synchronous evaluation, returns how many were run
+        if self.args.search_batch_size > 1:
+            self.run_steps(self.search_batched(self.args.search_batch_size))
+            return self.args.search_batch_size
+        self.run_steps(self.simulation_steps())
+        return 1
+
+    def search_steps(self, game_state) -> Generator[List[np.ndarray], Tuple[np.ndarray, np.ndarray], np.ndarray]:
+        # The search, as a generator that yields each batch of encoded states it needs evaluated and is sent back their (policies, values),
+        # so the same search runs with synchronous and asynchronous evaluation
+        # Returns the action probabilities
+        num_searches = self.start_search(game_state)
+
+        if self.args.search_batch_size > 1:
+            yield from self.search_batched(num_searches)
+        else:
+            for _search in range(num_searches):
+                yield from self.simulation_steps()
+
+        self.record_cache_stats()
+        return self.action_probs()
+
+    def simulation_steps(self) -> Generator[List[np.ndarray], Tuple[np.ndarray, np.ndarray], None]:
+        # One simulation, yielding the leaf's encoded state if it needs evaluating
+        node, depth = self.select_leaf()
+
+        value = self.terminal_value()
+        if value is None:
+            key, evaluation = self.lookup()
+            if evaluation is None:
+                policies, values = yield [self.scratch.get_neural_net_description_of_state()]
 
                 # policy = [0.1, 0.1, 0.2, 0.4, 0.2, 0.1, 0.1]
                 # random.shuffle(policy)
                 # value = node.game_state.score_position(node.game_state.get_current_player())
-                
+
                 # Extract float value
-                value = value.item()
+                evaluation = policies[0], float(values[0])
+                self.store(key, *evaluation)
+            policy, value = evaluation
+
+            # Expansion
+            node.expand(policy, self.scratch, self.scratch.get_possible_moves())
+        self.undo_moves(depth)
+
+        # Backpropagation
+        self.backpropagate(node, value)
+
+    def start_search(self, game_state) -> int:
+        # Sets up the root for a search of game_state, returns the number of simulations to run
+        # The tree is reused if the root (after advance_root) is the position being searched
+        inherited_visits = 0
+        if self.root is not None and self.root.player == game_state.get_current_player() and self.scratch.get_hash() == game_state.get_hash():
+            inherited_visits = self.root.visit_count
+        else:
+            self.root = MCTSNode(self.args, game_state.get_current_player())
+            self.scratch = game_state.get_copy()
+        num_searches = self.args.num_searches
+        if self.args.count_reused_visits:
+            num_searches = max(0, num_searches - inherited_visits)
+        self.stats = {"inherited_visits": inherited_visits, "simulations": num_searches}
+        if self.cache is not None:
+            self.cache.check_model(self.model)
+        return num_searches
 
-                # Expansion
-                node.expand(policy)
-            
-            # Backpropagation
-            self.backpropagate(node, value)
+    def record_cache_stats(self):
+        # The evaluation cache's hit rate since it was created (or its statistics were reset), which covers earlier searches sharing it too
+        if self.cache is not None:
+            self.stats["cache_hit_rate"] = self.cache.hit_rate()
+            self.stats["cache_size"] = len(self.cache)
 
+    def action_probs(self) -> np.ndarray:
+        # The visit counts of the root's children, normalized
         action_probs = np.zeros(self.game.get_action_size())
         for child in self.root.children.values():
             action_probs[child.action_taken] = child.visit_count
@@ -117,7 +265,155 @@ class AlphaMCTS():
             action_probs /= total_prob
         return action_probs
 
+    def search_batched(self, num_searches: int) -> Generator[List[np.ndarray], Tuple[np.ndarray, np.ndarray], None]:
+        # Collects up to search_batch_size leaves per round and evaluates them in one forward pass
+        # Leaves waiting for evaluation carry a virtual loss, so the following selections spread out over other leaves
+        simulations = 0
+        while simulations < num_searches:
+            leaves, states, leaf_moves, keys = [], [], [], []
+            while simulations < num_searches and len(leaves) < self.args.search_batch_size:
+                node, depth = self.select_leaf()
+                value = self.terminal_value()
+                if value is not None:
+                    self.undo_moves(depth)
+                    self.backpropagate(node, value)
+                    simulations += 1
+                elif any(node is leaf for leaf in leaves):
+                    # The virtual loss was not enough to steer the search elsewhere, so evaluate what we have
+                    self.undo_moves(depth)
+                    break
+                else:
+                    key, evaluation = self.lookup()
+                    if evaluation is not None:
+                        policy, value = evaluation
+                        node.expand(policy, self.scratch, self.scratch.get_possible_moves())
+                        self.undo_moves(depth)
+                        self.backpropagate(node, value)
+                        simulations += 1
+                        continue
+                    states.append(self.scratch.get_neural_net_description_of_state())
+                    leaf_moves.append(self.scratch.get_possible_moves())
+                    keys.append(key)
+                    self.undo_moves(depth)
+                    self.add_virtual_loss(node, +1)
+                    leaves.append(node)
+                    simulations += 1
+            if len(leaves) == 0: continue
+
+            policies, values = yield states
+            for leaf, possible_moves, key, policy, value in zip(leaves, leaf_moves, keys, policies, values):
+                self.add_virtual_loss(leaf, -1)
+                self.store(key, policy, float(value))
+                leaf.expand(policy, self.scratch, possible_moves)
+                self.backpropagate(leaf, float(value))
+
+    def select_leaf(self) -> Tuple[MCTSNode, int]:
+        # Walks down the tree, playing the moves on the scratch game
+        # Returns the leaf and the number of moves played to reach it
+        node = self.root
+        depth = 0
+        while node.is_fully_expanded():
+            node = node.best_child()
+            self.scratch.perform_move(node.move)
+            depth += 1
+        return node, depth
+
+    def undo_moves(self, depth: int):
+        for _ in range(depth):
+            self.scratch.undo_move()
+
+    def terminal_value(self) -> Optional[float]:
+        # Returns the value of the scratch game's position if the game is over there, otherwise None
+        if not self.scratch.is_game_over(): return None
+        winner = self.scratch.get_winner()
+        if winner == Player.FIRST:
+            return 10000
+        elif winner == Player.SECOND:
+            return -10000
+        return 0
+
+    def lookup(self) -> Tuple[Optional[CacheKey], Optional[Tuple[np.ndarray, float]]]:
+        # Returns the cache key of the scratch game's position and its cached (policy, value), or None if it is not cached
+        if self.cache is None: return None, None
+        key = self.cache.key(self.scratch)
+        return key, self.cache.get(key)
+
+    def store(self, key: Optional[CacheKey], policy: np.ndarray, value: float):
+        if self.cache is not None:
+            self.cache.put(key, policy, value)
+
+    def evaluate(self, states: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # Runs the network on a batch of encoded states, returns the softmaxed policies and the values
+        # With mirror_inference, the mirrored states go in the same batch and the outputs for both are averaged
+        mirror = self.mirror_inference()
+        if self.server is not None:
+            return self.merge_mirrored(*self.server.evaluate(self.add_mirrored(states)), len(states))
+        with torch.no_grad():
+            batch = torch.tensor(np.stack(states), device=self.model.device)
+            if mirror:
+                batch = torch.cat((batch, torch.flip(batch, dims=[-1])))
+            policy, value = self.model(batch)
+            policy = torch.softmax(policy, axis=1)
+            if mirror:
+                count = len(states)
+                policy = (policy[:count] + torch.flip(policy[count:], dims=[1])) / 2
+                value = (value[:count] + value[count:]) / 2
+        policy = policy.cpu().numpy()
+        value = value.cpu().flatten().numpy()
+        return policy, value
+
+    async def evaluate_async(self, states: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # evaluate through the server without blocking the event loop
+        # Without a server, the network runs right here, blocking the event loop for the forward pass
+        if self.server is None:
+            return self.evaluate(states)
+        policy, value = await self.server.evaluate_async(self.add_mirrored(states))
+        return self.merge_mirrored(policy, value, len(states))
+
+    def mirror_inference(self) -> bool:
+        return self.args.mirror_inference and self.game.is_mirror_symmetric()
+
+    def add_mirrored(self, states: List[np.ndarray]) -> List[np.ndarray]:
+        # With mirror_inference, appends the mirror image of every state
+        if not self.mirror_inference(): return states
+        return states + [np.ascontiguousarray(state[..., ::-1]) for state in states]
+
+    def merge_mirrored(self, policy: np.ndarray, value: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Averages the outputs for the states and their mirror images added by add_mirrored
+        if not self.mirror_inference(): return policy, value
+        return (policy[:count] + policy[count:, ::-1]) / 2, (value[:count] + value[count:]) / 2
+
+    def add_virtual_loss(self, node: MCTSNode, count: int):
+        # Adds (count = +1) or removes (count = -1) a pending visit that counts as a loss for the player choosing each node on the path
+        while node is not None:
+            node.visit_count += count
+            # Values are from the first player's point of view, so a loss for the first player (who moves into nodes where the second player is to move) is negative
+            loss = -self.args.virtual_loss if node.player == Player.SECOND else self.args.virtual_loss
+            node.value_sum += count * loss
+            node = node.parent
+
     def backpropagate(self, node: MCTSNode, value: float):
         while node is not None:
             node.update(value)
             node = node.parent
+
+if __name__ == "__main__":
+    # Compare simulations per second of the one-at-a-time search and batched search
+    import copy
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+
+    game = ConnectFourBitboard()
+    model = ResNet(game, connectfour_config.resNet_config)
+    model.load_model()
+    model.eval()
+    for search_batch_size in (1, 4, 8, 16, 32):
+        args = copy.copy(connectfour_config)
+        args.search_batch_size = search_batch_size
+        mcts = AlphaMCTS(game, model, args)
+        start = time.time()
+        action_probs = mcts.search(game)
+        elapsed = time.time() - start
+        mcts.root = None
+        print(f"search_batch_size {search_batch_size}: {args.num_searches / elapsed:.0f} simulations/second, "
+              f"policy {np.round(action_probs, 2)}")
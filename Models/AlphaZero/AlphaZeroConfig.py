@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from Models.AlphaZero.ResNetConfig import ResNetConfig, connectfour_resNet_config, chess_resNet_config
 
@@ -11,6 +12,52 @@ class AlphaZeroConfig:
 	num_epochs: int
 	batch_size: int
 	resNet_config: ResNetConfig
+	# Number of leaves AlphaMCTS collects (using virtual loss) before evaluating them in one forward pass
+	search_batch_size: int = 1
+	# search_batch_size used for self-play searches during training, where the change in move choice it brings does not matter
+	selfPlay_search_batch_size: int = 1
+	# How much each pending evaluation lowers a node's value during batched search, to spread a batch over different leaves
+	virtual_loss: float = 1.0
+	# Whether AlphaMCTS keeps the subtree of the moves played, so the next search starts from the visits already made
+	reuse_tree: bool = True
+	# Whether num_searches includes the visits inherited from the previous search (so fewer new simulations are run)
+	count_reused_visits: bool = False
+	# Whether AlphaMCTS keeps searching in a background thread while the opponent thinks (needs reuse_tree)
+	# Set count_reused_visits too, so the pondered visits shorten the next search
+	ponder: bool = False
+	# Whether AlphaMCTS evaluates every position together with its mirror image and averages the two (for mirror-symmetric games)
+	mirror_inference: bool = False
+	# Number of network evaluations AlphaMCTS keeps in an LRU cache keyed by position hash (0 disables the cache)
+	evaluation_cache_size: int = 0
+	# evaluation_cache_size used for self-play during training, where one cache is shared by all the games a process plays
+	selfPlay_evaluation_cache_size: int = 0
+	# How a loaded model is run when playing: "eager" (the PyTorch module), "torchscript" or "onnx" (needs onnxruntime), see InferenceBackend
+	inference_backend: str = "eager"
+	# Number of self-play games advanced in lockstep, with the leaves of all their searches evaluated in one forward pass (1 plays one game at a time)
+	num_parallel_games: int = 1
+	# Number of processes playing self-play games in parallel during training (1 plays them in the training process)
+	num_selfPlay_workers: int = 1
+	# Base random seed of the self-play workers
+	selfPlay_seed: int = 0
+	# Whether the mirror image of every self-play sample is trained on too (for mirror-symmetric games)
+	augment_mirror: bool = False
+	# Maximum number of samples in the replay buffer, kept on disk in the models folder across iterations and runs
+	replay_buffer_capacity: int = 200_000
+	# Training uses the samples of this many most recent iterations (None uses all that fit in the buffer)
+	replay_window_iterations: Optional[int] = 1
+	# Number of games each new checkpoint plays against the best one after every training iteration (0 skips gating and saves no best model)
+	gating_games: int = 0
+	# Score against the best checkpoint (wins plus half the draws, as a fraction of the games) a new checkpoint needs to replace it
+	gating_threshold: float = 0.55
+	# Number of games each new checkpoint plays against Minimax, which anchors the Elo ratings
+	gating_baseline_games: int = 0
+	# Seconds per move for the Minimax baseline
+	gating_baseline_time_limit: float = 0.05
+	# Simulations per move in gating games, fewer than in self-play to keep gating cheap
+	gating_num_searches: int = 50
+	# Number of minibatches gathered in a background thread ahead of the training step (0 gathers them in the training loop)
+	# Worth it when training on a GPU, where the thread overlaps gathering with the GPU's work; on the CPU they compete for the same cores
+	prefetch_batches: int = 0
 
 connectfour_config = AlphaZeroConfig(
 	exploration_weight = 1.414,
@@ -19,7 +66,14 @@ connectfour_config = AlphaZeroConfig(
 	num_selfPlay_iterations = 200,
 	num_epochs = 4,
 	batch_size = 64,
-	resNet_config = connectfour_resNet_config
+	resNet_config = connectfour_resNet_config,
+	selfPlay_search_batch_size = 8,
+	num_parallel_games = 32,
+	augment_mirror = True,
+	selfPlay_evaluation_cache_size = 200_000,
+	gating_games = 20,
+	gating_baseline_games = 10,
+	replay_window_iterations = 4
 )
 
 chess_config = AlphaZeroConfig(
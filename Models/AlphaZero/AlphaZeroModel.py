@@ -3,24 +3,33 @@
 # AlphaZero (Complete): https://www.youtube.com/watch?v=wuSQpLinRB4
 import torch
 import torch.nn.functional as F
-import numpy as np
-import random
-from tqdm import trange
+from tqdm import tqdm, trange
 import os
+import time
+from typing import Optional
 
 from Games.Game import Game, Player
 from Models.Model import Model
+from Models.Minimax import Minimax
 from Models.AlphaZero.AlphaMCTS import AlphaMCTS
 from Models.AlphaZero.ResNet import ResNet
 from Models.AlphaZero.AlphaZeroConfig import AlphaZeroConfig, connectfour_config
+from Models.AlphaZero.Gating import gate_checkpoint
+from Models.AlphaZero.InferenceBackend import make_inference_backend
+from Models.AlphaZero.InferenceServer import InferenceServer
+from Models.AlphaZero.ReplayBuffer import ReplayBuffer
+from Models.AlphaZero.MinibatchLoader import MinibatchLoader
+from Models.AlphaZero.SelfPlay import self_play_game, play_games, run_self_play_workers, mirror_samples, self_play_config
 
 class AlphaZeroModel(Model):
-	def __init__(self, config: AlphaZeroConfig, doTraining=False):
+	def __init__(self, config: AlphaZeroConfig, doTraining=False, server: Optional[InferenceServer] = None):
+		# With a server, the model plays with the server's network instead of loading its own
 		self.game = None
 		self.player = None
 
 		self.config = config
 		self.doTraining = doTraining
+		self.server = server
 
 	def set_game_and_player(self, game: Game, player: Player):
 		self.game = game
@@ -28,73 +37,52 @@ class AlphaZeroModel(Model):
 
 		if self.doTraining:
 			self.model = ResNet(self.game, self.config.resNet_config)
-			self.mcts = AlphaMCTS(self.game, self.model, self.config)
+			self.mcts = AlphaMCTS(self.game, self.model, self_play_config(self.config))
 			self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
 			self.learn()
 		else:
 			self.load_model()
 		
 	def load_model(self):
+		if self.server is not None:
+			self.model = self.server.model
+			self.mcts = AlphaMCTS(self.game, self.model, self.config, server=self.server)
+			return
 		self.model = ResNet(self.game, self.config.resNet_config)
 		self.model.load_model()
-		self.mcts = AlphaMCTS(self.game, self.model, self.config)
 		self.model.eval()
+		self.mcts = AlphaMCTS(self.game, make_inference_backend(self.model, self.game, self.config.inference_backend), self.config)
 	
 	def take_move(self):
 		assert(self.game.get_current_player() == self.player)
 		self.mcts.take_move()
 
-	def selfPlay(self):
-		memory = []
-		player = Player.FIRST
-		state = self.game
+	def run_search(self):
+		opp_move = self.game.get_opponent_move()
+		if opp_move:
+			self.mcts.advance_root(opp_move)
+		self.mcts.search_until(self.game, self.search_should_stop)
 
-		while True:
-			# print(state.get_display_text())
-			action_probs = self.mcts.search(state)
+	def stop_pondering(self):
+		self.mcts.stop_pondering()
 
-			memory.append((state, action_probs, player))
+	def best_move_so_far(self):
+		return self.mcts.best_move
 
-			move = None
-			if np.sum(action_probs) > 0:
-				action_index = np.random.choice(self.game.get_action_size(), p=action_probs)
-				move = self.game.get_move_by_index(action_index)
-			else:
-				move = random.choice(state.get_possible_moves())
-
-			state = state.get_copy()
-			state.perform_move(move)
-
-			value, is_terminal = state.get_value_and_terminated()
-
-			if is_terminal:
-				returnMemory = []
-				for hist_state, hist_action_probs, hist_player in memory:
-					if value > 0: value = 1
-					elif value < 0: value = -1
-					hist_outcome = value
-					returnMemory.append((
-						hist_state.get_neural_net_description_of_state(),
-						hist_action_probs,
-						hist_outcome
-					))
-				return returnMemory
-			
-			# Switch player turn
-			player = Player.SECOND if player == Player.FIRST else Player.FIRST
-	
-	def train(self, memory):
-		random.shuffle(memory)
-		for batchIdx in range(0, len(memory), self.config.batch_size):
-			sample = memory[batchIdx:batchIdx+self.config.batch_size]
-			state, policy_targets, value_targets = zip(*sample)
+	def play_move(self, move):
+		self.mcts.play_move(move)
 
-			state, policy_targets, value_targets = np.array(state), np.array(policy_targets), np.array(value_targets).reshape(-1, 1)
-			
-			state = torch.tensor(state, dtype=torch.float32, device=self.model.device)
-			policy_targets = torch.tensor(policy_targets, dtype=torch.float32, device=self.model.device)
-			value_targets = torch.tensor(value_targets, dtype=torch.float32, device=self.model.device)
-			
+	async def take_move_async(self):
+		# take_move for use from asyncio, letting other games run while the server evaluates this one's positions
+		assert(self.game.get_current_player() == self.player)
+		await self.mcts.take_move_async()
+
+	def selfPlay(self):
+		return self_play_game(self.game, self.mcts)
+	
+	def train(self, replay_buffer: ReplayBuffer):
+		batches = MinibatchLoader(replay_buffer, self.config.batch_size, self.model.device, self.config.prefetch_batches)
+		for state, policy_targets, value_targets in batches:
 			out_policy, out_value = self.model(state)
 			
 			policy_loss = F.cross_entropy(out_policy, policy_targets)
@@ -104,18 +92,45 @@ class AlphaZeroModel(Model):
 			self.optimizer.zero_grad()
 			loss.backward()
 			self.optimizer.step()
+			self.model.weights_changed()
+
+	def make_replay_buffer(self) -> ReplayBuffer:
+		# Opens the replay buffer in the models folder, continuing from the samples of a previous run if there is one
+		return ReplayBuffer(
+			os.path.join(self.config.resNet_config.models_folder, "replay_buffer"),
+			self.config.replay_buffer_capacity,
+			self.game.get_neural_net_description_of_state().shape,
+			self.game.get_action_size(),
+			self.config.replay_window_iterations
+		)
 
 	def learn(self):
+		replay_buffer = self.make_replay_buffer()
+		# Checkpoint names on the Elo ladder, which persists across runs, start with the run's start time to stay unique
+		run_id = time.strftime("%Y%m%d-%H%M%S")
 		for iteration in range(self.config.num_iterations):
 			memory = []
+			replay_buffer.new_iteration()
 			
 			self.model.eval()
-			for _selfPlay_iteration in trange(self.config.num_selfPlay_iterations):
-				memory += self.selfPlay()
+			if self.config.num_selfPlay_workers > 1:
+				seed = self.config.selfPlay_seed + iteration * self.config.num_selfPlay_workers
+				memory, games_per_minute = run_self_play_workers(self.game, self.config, self.model.state_dict(), self.config.num_selfPlay_iterations, seed)
+				print(f"Self-play: {games_per_minute:.1f} games/minute")
+			else:
+				for samples in tqdm(play_games(self.game, self.model, self.mcts, self.config, self.config.num_selfPlay_iterations), total=self.config.num_selfPlay_iterations):
+					memory += samples
+				if self.mcts.cache is not None:
+					print(f"Self-play: {100 * self.mcts.cache.hit_rate():.0f}% evaluation cache hit rate")
+					self.mcts.cache.reset_statistics()
+			if self.config.augment_mirror and self.game.is_mirror_symmetric():
+				memory = mirror_samples(memory)
+			replay_buffer.add(memory)
+			replay_buffer.flush()
 				
 			self.model.train()
 			for _epoch in trange(self.config.num_epochs):
-				self.train(memory)
+				self.train(replay_buffer)
 
 			save_folder = self.config.resNet_config.models_folder
 			if not os.path.exists(save_folder):
@@ -123,9 +138,14 @@ class AlphaZeroModel(Model):
 			torch.save(self.model.state_dict(), os.path.join(save_folder, f"model_{iteration}.pt"))
 			torch.save(self.optimizer.state_dict(), os.path.join(save_folder, f"optimizer_{iteration}.pt"))
 
+			if self.config.gating_games > 0:
+				self.model.eval()
+				baseline = lambda: Minimax(time_limit=self.config.gating_baseline_time_limit)
+				gate_checkpoint(self.game.get_copy, self.model, f"{run_id}/model_{iteration}", self.config, baseline)
+
 if __name__ == "__main__":
-	from Games.ConnectFour import ConnectFour
+	from Games.ConnectFourBitboard import ConnectFourBitboard
 
 	alphaZero = AlphaZeroModel(connectfour_config, True)
-	alphaZero.set_game_and_player(ConnectFour(), Player.FIRST)
+	alphaZero.set_game_and_player(ConnectFourBitboard(), Player.FIRST)
 	alphaZero.learn()
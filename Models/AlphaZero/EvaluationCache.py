@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+import torch
+
+from Games.Game import Game
+
+# (position hash, whether the position is the mirror image of the one stored under that hash)
+CacheKey = Tuple[int, bool]
+
+def model_fingerprint(model: torch.nn.Module) -> Tuple[int, int]:
+    # Changes when the model is replaced or its weights_version is bumped (see ResNet.weights_changed)
+    # Models without a weights_version, such as the inference backends (which snapshot the weights), never change
+    return id(model), getattr(model, "weights_version", 0)
+
+# LRU cache of network evaluations (softmaxed policy and value) keyed by position hash
+# With share_mirrors (for searches using mirror_inference, whose outputs for a position and its mirror image are exact mirrors),
+# a position and its mirror image share one entry in mirror-symmetric games, stored under the smaller of their two hashes
+# The entries are dropped when the model's weights change
+class EvaluationCache:
+
+    def __init__(self, capacity: int, share_mirrors: bool = False):
+        self.capacity = capacity
+        self.share_mirrors = share_mirrors
+        self.entries: OrderedDict[int, Tuple[np.ndarray, float]] = OrderedDict()
+        self.fingerprint: Optional[Tuple[int, int]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def check_model(self, model: torch.nn.Module):
+        # Clears the cache if the model's weights changed since the last check
+        fingerprint = model_fingerprint(model)
+        if fingerprint != self.fingerprint:
+            self.entries.clear()
+            self.fingerprint = fingerprint
+
+    def key(self, game: Game) -> CacheKey:
+        position_hash = game.get_hash()
+        mirrored_hash = game.get_mirrored_hash() if self.share_mirrors and game.is_mirror_symmetric() else None
+        if mirrored_hash is not None and mirrored_hash < position_hash:
+            return mirrored_hash, True
+        return position_hash, False
+
+    def get(self, key: CacheKey) -> Optional[Tuple[np.ndarray, float]]:
+        position_hash, mirrored = key
+        entry = self.entries.get(position_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(position_hash)
+        policy, value = entry
+        return (policy[::-1] if mirrored else policy), value
+
+    def put(self, key: CacheKey, policy: np.ndarray, value: float):
+        position_hash, mirrored = key
+        self.entries[position_hash] = ((policy[::-1] if mirrored else policy), value)
+        self.entries.move_to_end(position_hash)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
@@ -0,0 +1,164 @@
+import dataclasses
+import json
+import os
+import random
+from typing import Callable, Dict, List, Optional, Union
+import numpy as np
+import torch
+
+from Games.Game import Game, Player
+from Models.Model import Model
+from Models.AlphaZero.AlphaMCTS import AlphaMCTS
+from Models.AlphaZero.AlphaZeroConfig import AlphaZeroConfig
+from Models.AlphaZero.EvaluationCache import EvaluationCache
+from Models.AlphaZero.ResNet import ResNet
+
+ELO_K = 32
+INITIAL_RATING = 1000.0
+
+def play_evaluation_games(new_game: Callable[[], Game], candidate: ResNet, opponent: Union[ResNet, Callable[[], Model]], config: AlphaZeroConfig, num_games: int, seed: int = 0) -> List[float]:
+    # Plays num_games games between the candidate network and an opponent, which is either another network or makes a Model
+    # Games come in pairs from the same random two-move opening, with the candidate moving first in one and second in the other
+    # Networks pick the most visited move of config.num_searches simulations, and all games advance in lockstep:
+    # every round, the positions the searches of all games need evaluated by the same network go through it in one forward pass
+    # Returns the candidate's score in each game (1 for a win, 1/2 for a draw, 0 for a loss)
+    networks = [candidate] + ([opponent] if isinstance(opponent, ResNet) else [])
+    caches = {id(network): EvaluationCache(config.evaluation_cache_size, config.mirror_inference) if config.evaluation_cache_size > 0 else None for network in networks}
+    states, players = [], []
+    for index in range(num_games):
+        state = new_game()
+        rng = random.Random(seed + index // 2)
+        for _ in range(2):
+            state.perform_move(rng.choice(state.get_possible_moves()))
+        candidate_player = Player.FIRST if index % 2 == 0 else Player.SECOND
+        opponent_player = Player.SECOND if candidate_player == Player.FIRST else Player.FIRST
+        game_players: Dict[Player, Union[AlphaMCTS, Model]] = {candidate_player: AlphaMCTS(state, candidate, config, caches[id(candidate)])}
+        if isinstance(opponent, ResNet):
+            game_players[opponent_player] = AlphaMCTS(state, opponent, config, caches[id(opponent)])
+        else:
+            model = opponent()
+            model.set_game_and_player(state, opponent_player)
+            game_players[opponent_player] = model
+        states.append(state)
+        players.append(game_players)
+
+    def play(index: int, move):
+        state = states[index]
+        state.perform_move(move)
+        for player in players[index].values():
+            if isinstance(player, AlphaMCTS):
+                player.advance_root(move)
+
+    playing = set(range(num_games))
+    while len(playing) > 0:
+        # Models that are not networks move right away
+        for index in list(playing):
+            state = states[index]
+            while not state.is_game_over() and not isinstance(players[index][state.get_current_player()], AlphaMCTS):
+                players[index][state.get_current_player()].take_move()
+                move = state.get_opponent_move()
+                for player in players[index].values():
+                    if isinstance(player, AlphaMCTS):
+                        player.advance_root(move)
+            if state.is_game_over():
+                playing.remove(index)
+        # One move of every remaining game, searched in lockstep
+        searches = {}
+        def step(index: int, mcts: AlphaMCTS, steps, evaluation=None):
+            # Runs a search until it needs positions evaluated, or plays its move when it is done
+            try:
+                searches[index] = (mcts, steps, next(steps) if evaluation is None else steps.send(evaluation))
+            except StopIteration as stop:
+                searches.pop(index, None)
+                play(index, states[index].get_move_by_index(int(np.argmax(stop.value))))
+        for index in playing:
+            mcts = players[index][states[index].get_current_player()]
+            step(index, mcts, mcts.search_steps(states[index]))
+        while len(searches) > 0:
+            for network in networks:
+                requests = [(index, mcts, steps, request) for index, (mcts, steps, request) in searches.items() if mcts.model is network]
+                if len(requests) == 0: continue
+                policies, values = requests[0][1].evaluate([state for _, _, _, request in requests for state in request])
+                start = 0
+                for index, mcts, steps, request in requests:
+                    end = start + len(request)
+                    step(index, mcts, steps, (policies[start:end], values[start:end]))
+                    start = end
+
+    scores = []
+    for index, state in enumerate(states):
+        candidate_player = Player.FIRST if index % 2 == 0 else Player.SECOND
+        winner = state.get_winner()
+        scores.append(0.5 if winner is None else float(winner == candidate_player))
+    return scores
+
+# Elo ratings of checkpoints and baselines, kept in a JSON file in the models folder
+# Baselines are anchored: their rating stays fixed, so ratings stay comparable across training runs
+class EloLadder:
+
+    def __init__(self, path: str, anchors: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.ratings: Dict[str, float] = {}
+        self.anchors = anchors if anchors is not None else {}
+        self.best: Optional[str] = None
+        self.history: List[dict] = []
+        if os.path.exists(path):
+            with open(path) as file:
+                saved = json.load(file)
+            self.ratings = saved["ratings"]
+            self.best = saved["best"]
+            self.history = saved["history"]
+        self.ratings.update(self.anchors)
+
+    def rating(self, name: str) -> float:
+        if name not in self.ratings:
+            # New checkpoints start at the rating of the best one
+            self.ratings[name] = self.ratings.get(self.best, INITIAL_RATING)
+        return self.ratings[name]
+
+    def record(self, name: str, opponent: str, scores: List[float]):
+        # Updates both ratings after each game
+        for score in scores:
+            rating, opponent_rating = self.rating(name), self.rating(opponent)
+            expected = 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+            if name not in self.anchors:
+                self.ratings[name] = rating + ELO_K * (score - expected)
+            if opponent not in self.anchors:
+                self.ratings[opponent] = opponent_rating - ELO_K * (score - expected)
+        self.history.append({"player": name, "opponent": opponent, "games": len(scores), "score": sum(scores)})
+
+    def save(self):
+        with open(self.path + ".tmp", "w") as file:
+            json.dump({"ratings": self.ratings, "best": self.best, "history": self.history}, file, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+def gate_checkpoint(new_game: Callable[[], Game], candidate: ResNet, name: str, config: AlphaZeroConfig, baseline: Optional[Callable[[], Model]] = None) -> bool:
+    # Plays the candidate against the best checkpoint so far (and the baseline, for its rating), updates the Elo ladder,
+    # and saves the candidate as resNet_config.best_model_path if it scored at least config.gating_threshold
+    # Returns whether the candidate was promoted
+    resNet_config = config.resNet_config
+    evaluation_config = dataclasses.replace(config, num_searches=config.gating_num_searches)
+    ladder = EloLadder(os.path.join(resNet_config.models_folder, "elo.json"), {"baseline": INITIAL_RATING} if baseline is not None else None)
+    if name in ladder.ratings:
+        raise ValueError(f"{name} is already on the Elo ladder; checkpoints need unique names")
+    candidate.eval()
+    if baseline is not None and config.gating_baseline_games > 0:
+        scores = play_evaluation_games(new_game, candidate, baseline, evaluation_config, config.gating_baseline_games)
+        ladder.record(name, "baseline", scores)
+        print(f"{name} vs baseline: {100 * np.mean(scores):.0f}% score")
+
+    promoted = True
+    if ladder.best is not None and os.path.exists(resNet_config.best_model_path):
+        best = ResNet(new_game(), resNet_config)
+        best.load_state_dict(torch.load(resNet_config.best_model_path, map_location=resNet_config.device))
+        best.eval()
+        scores = play_evaluation_games(new_game, candidate, best, evaluation_config, config.gating_games)
+        ladder.record(name, ladder.best, scores)
+        promoted = np.mean(scores) >= config.gating_threshold
+        print(f"{name} vs {ladder.best}: {100 * np.mean(scores):.0f}% score, {'promoted' if promoted else 'not promoted'}")
+    if promoted:
+        torch.save(candidate.state_dict(), resNet_config.best_model_path)
+        ladder.best = name
+    ladder.rating(name)
+    ladder.save()
+    return promoted
@@ -0,0 +1,144 @@
+import copy
+import io
+from typing import Dict, List, Optional, Tuple
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from Games.Game import Game
+from Models.AlphaZero.ResNet import ResNet
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+BACKENDS = ("eager", "torchscript", "onnx")
+
+def fold_batch_norm(model: ResNet) -> ResNet:
+    # Returns a copy of the model in eval mode with every BatchNorm folded into the convolution before it
+    # (a statically quantized model has them folded already)
+    folded = copy.deepcopy(model).eval()
+    for sequential in (folded.startBlock, folded.policyHead, folded.valueHead):
+        for i in range(len(sequential) - 1):
+            if isinstance(sequential[i], nn.Conv2d) and isinstance(sequential[i + 1], nn.BatchNorm2d):
+                sequential[i] = fuse_conv_bn_eval(sequential[i], sequential[i + 1])
+                sequential[i + 1] = nn.Identity()
+    for resBlock in folded.backBone:
+        if isinstance(resBlock.bn1, nn.BatchNorm2d):
+            resBlock.conv1, resBlock.bn1 = fuse_conv_bn_eval(resBlock.conv1, resBlock.bn1), nn.Identity()
+        if isinstance(resBlock.bn2, nn.BatchNorm2d):
+            resBlock.conv2, resBlock.bn2 = fuse_conv_bn_eval(resBlock.conv2, resBlock.bn2), nn.Identity()
+    return folded
+
+def example_input(game: Game, device: torch.device) -> torch.Tensor:
+    # A batch of one encoded state, to trace the network with
+    return torch.tensor(game.get_neural_net_description_of_state(), device=device).unsqueeze(0)
+
+# The backends below are called like the ResNet: backend(states) returns (policy logits, values), and backend.device is where inputs go
+# They are for inference only, so their weights never change (and they have no parameters)
+
+class TorchScriptBackend(nn.Module):
+    # The network traced to TorchScript and frozen, which removes Python overhead from every call
+    def __init__(self, model: ResNet, game: Game):
+        super().__init__()
+        self.device = model.device
+        with torch.no_grad():
+            traced = torch.jit.trace(fold_batch_norm(model), example_input(game, self.device))
+        self.module = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    def forward(self, x):
+        return self.module(x)
+
+    def save(self, path: str):
+        torch.jit.save(self.module, path)
+
+class OnnxBackend(nn.Module):
+    # The network exported to ONNX and run by ONNX Runtime on the CPU
+    def __init__(self, model: ResNet, game: Game):
+        super().__init__()
+        if onnxruntime is None:
+            raise ImportError("The onnx inference backend needs the onnxruntime package")
+        self.device = torch.device("cpu")
+        folded = fold_batch_norm(model).to(self.device)
+        exported = io.BytesIO()
+        torch.onnx.export(
+            folded, example_input(game, self.device), exported,
+            input_names=["states"], output_names=["policy", "value"],
+            dynamic_axes={"states": {0: "batch"}, "policy": {0: "batch"}, "value": {0: "batch"}}
+        )
+        self.onnx_model = exported.getvalue()
+        self.session = onnxruntime.InferenceSession(self.onnx_model, providers=["CPUExecutionProvider"])
+
+    def forward(self, x):
+        policy, value = self.session.run(None, {"states": x.cpu().numpy()})
+        return torch.from_numpy(policy), torch.from_numpy(value)
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(self.onnx_model)
+
+def make_inference_backend(model: ResNet, game: Game, backend: str) -> nn.Module:
+    # Returns the network to evaluate positions of game with: the model itself for "eager", or a compiled copy of its current weights
+    assert backend in BACKENDS
+    if backend == "torchscript":
+        return TorchScriptBackend(model, game)
+    if backend == "onnx":
+        return OnnxBackend(model, game)
+    return model
+
+def available_backends() -> List[str]:
+    # The backends that can run here (onnx needs onnxruntime)
+    return [backend for backend in BACKENDS if backend != "onnx" or onnxruntime is not None]
+
+def check_parity(model: ResNet, game: Game, backends: Optional[List[str]] = None, num_states: int = 64, tolerance: float = 1e-3) -> Dict[str, Tuple[float, float]]:
+    # Compiles model with each backend (all available ones by default) and compares their outputs with the eager model's on random positions
+    # Raises AssertionError if a backend's policy logits or values differ by more than tolerance
+    # Returns the largest (policy, value) difference of each backend
+    model.eval()
+    backends = available_backends() if backends is None else backends
+    row_count, column_count, _action_size = game.get_board_info()
+    states = (torch.rand((num_states, 3, row_count, column_count), device=model.device) < 0.3).float()
+    errors = {}
+    with torch.no_grad():
+        reference_policy, reference_value = model(states)
+        for backend in backends:
+            network = make_inference_backend(model, game, backend)
+            policy, value = network(states.to(network.device))
+            policy_error = (policy.to(model.device) - reference_policy).abs().max().item()
+            value_error = (value.to(model.device) - reference_value).abs().max().item()
+            assert policy_error <= tolerance and value_error <= tolerance, \
+                f"{backend} differs from eager by {policy_error:.1e} (policy), {value_error:.1e} (value)"
+            errors[backend] = (policy_error, value_error)
+    return errors
+
+if __name__ == "__main__":
+    # Parity with the eager model, and latency per call at several batch sizes
+    import time
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+
+    game = ConnectFourBitboard()
+    model = ResNet(game, connectfour_config.resNet_config)
+    model.load_model()
+    model.eval()
+    backends = available_backends()
+    if onnxruntime is None:
+        print("onnxruntime is not installed, skipping the onnx backend")
+    for backend, (policy_error, value_error) in check_parity(model, game, backends).items():
+        print(f"{backend}: max difference from eager {policy_error:.1e} (policy), {value_error:.1e} (value)")
+    compiled = {backend: make_inference_backend(model, game, backend) for backend in backends}
+    states = (torch.rand((64, 3, 6, 7), device=model.device) < 0.3).float()
+    with torch.no_grad():
+        for batch_size in (1, 8, 64):
+            batch = states[:batch_size]
+            for backend, network in compiled.items():
+                batch = batch.to(network.device)
+                for _ in range(20):
+                    network(batch)
+                calls = 200
+                start = time.time()
+                for _ in range(calls):
+                    network(batch)
+                elapsed = time.time() - start
+                print(f"batch size {batch_size}, {backend}: {1000 * elapsed / calls:.2f} ms/call")
@@ -0,0 +1,176 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+import numpy as np
+import torch
+
+# Evaluates positions for many searches with one copy of the network, running on its own thread
+# Requests (lists of encoded states) wait in a queue; the server takes the first one, then keeps collecting requests
+# for up to max_wait seconds or until it has max_batch_size states, and evaluates them all in one forward pass
+# Results come back through futures, so callers can block on them or await them from asyncio
+class InferenceServer:
+
+    def __init__(self, model: torch.nn.Module, max_batch_size: int = 64, max_wait: float = 0.002):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests: queue.Queue = queue.Queue()
+        self.thread = None
+        # Guards closed, so no request is queued after the sentinel put by close
+        self.lock = threading.Lock()
+        self.closed = False
+        self.batches = 0
+        self.evaluations = 0
+
+    def __enter__(self) -> "InferenceServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.serve, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        # Evaluates the requests submitted before closing, then stops the thread
+        # Requests left in the queue (when the server was never started) fail, as do requests submitted after closing
+        with self.lock:
+            if self.closed: return
+            self.closed = True
+            self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].set_exception(RuntimeError("InferenceServer was closed before evaluating the request"))
+
+    def submit(self, states: List[np.ndarray]) -> Future:
+        # Queues states for evaluation; the future's result is their (softmaxed policies, values)
+        future = Future()
+        with self.lock:
+            if self.closed:
+                future.set_exception(RuntimeError("InferenceServer is closed"))
+            else:
+                self.requests.put((states, future))
+        return future
+
+    def evaluate(self, states: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        return self.submit(states).result()
+
+    async def evaluate_async(self, states: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        return await asyncio.wrap_future(self.submit(states))
+
+    def average_batch_size(self) -> float:
+        return self.evaluations / self.batches if self.batches > 0 else 0.0
+
+    def serve(self):
+        stopping = False
+        while not stopping:
+            request = self.requests.get()
+            if request is None: break
+            batch = [request]
+            count = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                count += len(request[0])
+            self.run_batch(batch)
+
+    def run_batch(self, batch: List[Tuple[List[np.ndarray], Future]]):
+        try:
+            states = np.stack([state for states, _future in batch for state in states])
+            with torch.no_grad():
+                policy, value = self.model(torch.tensor(states, device=self.model.device))
+            policy = torch.softmax(policy, axis=1).cpu().numpy()
+            value = value.cpu().flatten().numpy()
+        except Exception as exception:
+            for _states, future in batch:
+                future.set_exception(exception)
+            return
+        self.batches += 1
+        self.evaluations += len(states)
+        start = 0
+        for states, future in batch:
+            end = start + len(states)
+            future.set_result((policy[start:end], value[start:end]))
+            start = end
+
+if __name__ == "__main__":
+    # Play many games at once with asyncio against one shared network, and compare with playing the same games one after another
+    import dataclasses
+    import random
+    from Games.Game import Player
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+    from Models.AlphaZero.AlphaZeroModel import AlphaZeroModel
+    from Models.AlphaZero.ResNet import ResNet
+    from Models.RandomModel import RandomModel
+
+    num_games = 64
+    config = dataclasses.replace(connectfour_config, num_searches=50, search_batch_size=8, inference_backend="eager")
+
+    def new_game(seed: int) -> ConnectFourBitboard:
+        # Games start from different random openings
+        rng = random.Random(seed)
+        game = ConnectFourBitboard()
+        for _ in range(2):
+            game.perform_move(rng.choice(game.get_possible_moves()))
+        return game
+
+    async def play(game, alphaZero: AlphaZeroModel, opponent: RandomModel):
+        while not game.is_game_over():
+            if game.get_current_player() == Player.FIRST:
+                await alphaZero.take_move_async()
+            else:
+                opponent.take_move()
+
+    async def play_all(server: InferenceServer):
+        games = []
+        for seed in range(num_games):
+            game = new_game(seed)
+            alphaZero = AlphaZeroModel(config, server=server)
+            alphaZero.set_game_and_player(game, Player.FIRST)
+            opponent = RandomModel()
+            opponent.set_game_and_player(game, Player.SECOND)
+            games.append(play(game, alphaZero, opponent))
+        await asyncio.gather(*games)
+
+    model = ResNet(ConnectFourBitboard(), config.resNet_config)
+    model.load_model()
+    model.eval()
+    with InferenceServer(model) as server:
+        start = time.time()
+        asyncio.run(play_all(server))
+        elapsed = time.time() - start
+    print(f"{num_games} games through the server: {elapsed:.1f}s, average batch size {server.average_batch_size():.1f}")
+
+    start = time.time()
+    for seed in range(num_games):
+        game = new_game(seed)
+        alphaZero = AlphaZeroModel(config)
+        alphaZero.set_game_and_player(game, Player.FIRST)
+        opponent = RandomModel()
+        opponent.set_game_and_player(game, Player.SECOND)
+        while not game.is_game_over():
+            (alphaZero if game.get_current_player() == Player.FIRST else opponent).take_move()
+    print(f"{num_games} games one after another: {time.time() - start:.1f}s")
@@ -0,0 +1,136 @@
+import queue
+import threading
+from typing import Iterator, Tuple
+import torch
+
+from Models.AlphaZero.ReplayBuffer import ReplayBuffer
+
+Batch = Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+
+# Iterates over the samples of a replay buffer in shuffled minibatches of (states, policy targets, value targets) tensors on device
+# The buffer's arrays are wrapped as tensors without copying, shuffling permutes indices only,
+# and each minibatch is gathered with a single index_select per array (into pinned memory when copying to a GPU)
+# With prefetch > 0, up to that many minibatches are gathered by a background thread while the training step runs
+class MinibatchLoader:
+
+    def __init__(self, replay_buffer: ReplayBuffer, batch_size: int, device: torch.device, prefetch: int = 2):
+        self.replay_buffer = replay_buffer
+        self.batch_size = batch_size
+        self.device = device
+        self.prefetch = prefetch
+        # Views of the memory-mapped arrays
+        self.states = torch.from_numpy(replay_buffer.states)
+        self.policies = torch.from_numpy(replay_buffer.policies)
+        self.values = torch.from_numpy(replay_buffer.values)
+        self.pin_memory = device.type == "cuda"
+
+    def __len__(self) -> int:
+        return -(-len(self.replay_buffer) // self.batch_size)
+
+    def __iter__(self) -> Iterator[Batch]:
+        positions = torch.randperm(len(self.replay_buffer))
+        indices = torch.from_numpy(self.replay_buffer.indices(positions.numpy()))
+        # Sorting within a minibatch keeps reads from the memory map in file order
+        batches = (indices[start:start + self.batch_size].sort().values for start in range(0, len(indices), self.batch_size))
+        if self.prefetch <= 0:
+            for batch_indices in batches:
+                yield self.load(batch_indices)
+            return
+
+        loaded = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        def produce():
+            try:
+                for batch_indices in batches:
+                    if stop.is_set(): return
+                    loaded.put(self.load(batch_indices))
+            finally:
+                loaded.put(None)
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = loaded.get()
+                if batch is None: break
+                yield batch
+        finally:
+            # If the consumer stops early, let the producer finish its current put and exit
+            stop.set()
+            while producer.is_alive():
+                try:
+                    loaded.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def load(self, indices: torch.Tensor) -> Batch:
+        return self.gather(self.states, indices), self.gather(self.policies, indices), self.gather(self.values, indices)
+
+    def gather(self, source: torch.Tensor, indices: torch.Tensor) -> torch.Tensor:
+        if not self.pin_memory:
+            return torch.index_select(source, 0, indices).to(self.device)
+        # The pinned allocator keeps the memory alive until the asynchronous copy has finished
+        gathered = torch.empty((len(indices), *source.shape[1:]), dtype=source.dtype, pin_memory=True)
+        torch.index_select(source, 0, indices, out=gathered)
+        return gathered.to(self.device, non_blocking=True)
+
+if __name__ == "__main__":
+    # Compare training steps per second of the list-of-tuples loop the training used to run, and of the loader with and without prefetching
+    import tempfile
+    import time
+    import numpy as np
+    import torch.nn.functional as F
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+    from Models.AlphaZero.ResNet import ResNet
+
+    game = ConnectFourBitboard()
+    config = connectfour_config
+    device = config.resNet_config.device
+    num_samples = 20_000
+    action_size = game.get_action_size()
+    memory = [(
+        np.random.randint(0, 2, (3, 6, 7)).astype(np.float32),
+        np.random.dirichlet(np.ones(action_size)),
+        float(np.random.choice([-1, 0, 1]))
+    ) for _ in range(num_samples)]
+    replay_buffer = ReplayBuffer(tempfile.mkdtemp(), num_samples, memory[0][0].shape, action_size)
+    replay_buffer.add(memory)
+
+    model = ResNet(game, config.resNet_config)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    def step(state, policy_targets, value_targets, train_model):
+        if not train_model: return
+        out_policy, out_value = model(state)
+        loss = F.cross_entropy(out_policy, policy_targets) + F.mse_loss(out_value, value_targets)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+    def tuple_batches():
+        import random
+        random.shuffle(memory)
+        for batchIdx in range(0, len(memory), config.batch_size):
+            sample = memory[batchIdx:batchIdx+config.batch_size]
+            state, policy_targets, value_targets = zip(*sample)
+            state, policy_targets, value_targets = np.array(state), np.array(policy_targets), np.array(value_targets).reshape(-1, 1)
+            yield (
+                torch.tensor(state, dtype=torch.float32, device=device),
+                torch.tensor(policy_targets, dtype=torch.float32, device=device),
+                torch.tensor(value_targets, dtype=torch.float32, device=device)
+            )
+
+    pipelines = {
+        "list of tuples": tuple_batches,
+        "loader": lambda: MinibatchLoader(replay_buffer, config.batch_size, device, prefetch=0),
+        "loader, prefetch 2": lambda: MinibatchLoader(replay_buffer, config.batch_size, device, prefetch=2)
+    }
+    for train_model in (False, True):
+        for name, batches in pipelines.items():
+            steps = 0
+            start = time.time()
+            for batch in batches():
+                step(*batch, train_model)
+                steps += 1
+                if train_model and steps == 100: break
+            elapsed = time.time() - start
+            print(f"{name}{', with training step' if train_model else ', data only'}: {steps / elapsed:.0f} steps/second")
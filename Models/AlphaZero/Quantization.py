@@ -0,0 +1,114 @@
+import dataclasses
+import os
+import numpy as np
+import torch
+
+from Games.Game import Game
+from Models.AlphaZero.AlphaMCTS import AlphaMCTS
+from Models.AlphaZero.AlphaZeroConfig import AlphaZeroConfig
+from Models.AlphaZero.ReplayBuffer import ReplayBuffer
+from Models.AlphaZero.ResNet import ResNet
+from Models.AlphaZero.ResNetConfig import ResNetConfig
+from Models.AlphaZero.SelfPlay import play_games
+
+def calibration_states(game: Game, model: ResNet, config: AlphaZeroConfig, count: int) -> torch.Tensor:
+    # Returns count encoded positions to calibrate a quantized network with
+    # They are sampled from the replay buffer of a previous training run, or played out by model if there is none
+    folder = os.path.join(config.resNet_config.models_folder, "replay_buffer")
+    if os.path.exists(os.path.join(folder, ReplayBuffer.METADATA_FILE)):
+        replay_buffer = ReplayBuffer(folder, config.replay_buffer_capacity, game.get_neural_net_description_of_state().shape, game.get_action_size())
+        if len(replay_buffer) > 0:
+            states, _policies, _values = replay_buffer.sample(count)
+            return torch.from_numpy(states)
+    # A quick self-play run gives positions from the same distribution
+    config = dataclasses.replace(config, num_searches=20, evaluation_cache_size=0)
+    states = []
+    mcts = AlphaMCTS(game, model, config)
+    for samples in play_games(game, model, mcts, config, count):
+        states += [state for state, _action_probs, _outcome in samples]
+        if len(states) >= count: break
+    return torch.from_numpy(np.array(states[:count]))
+
+def quantize_model(game: Game, config: AlphaZeroConfig, quantized_config: ResNetConfig, num_calibration_states: int = 512) -> ResNet:
+    # Quantizes the float model of config to the mode of quantized_config and saves it to quantized_config.model_path,
+    # from where ResNet(game, quantized_config).load_model() loads it
+    # "dynamic" only quantizes the Linear layers of the heads, not the convolutional trunk; "static" quantizes the convolutions too
+    model = ResNet(game, config.resNet_config)
+    model.load_model()
+    model.eval()
+    states = calibration_states(game, model, config, num_calibration_states) if quantized_config.quantization == "static" else None
+    model.quantize(quantized_config.quantization, states)
+    torch.save(model.state_dict(), quantized_config.model_path)
+    return model
+
+if __name__ == "__main__":
+    # Quantize the ConnectFour model in both modes, then compare speed and playing strength with the float model
+    import random
+    import time
+    from Games.Game import Player
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from GameRunner import GameRunner
+    from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+    from Models.AlphaZero.AlphaZeroModel import AlphaZeroModel
+    from Models.AlphaZero.ResNetConfig import connectfour_int8_resNet_config
+
+    torch.manual_seed(0)
+    np.random.seed(0)
+    random.seed(0)
+    game = ConnectFourBitboard()
+    # Compare the networks themselves, so the float model runs eagerly on the CPU too
+    float_config = dataclasses.replace(
+        connectfour_config,
+        inference_backend="eager",
+        resNet_config=dataclasses.replace(connectfour_config.resNet_config, device=torch.device("cpu"))
+    )
+    configs = {"fp32": float_config}
+    for mode in ("dynamic", "static"):
+        resNet_config = dataclasses.replace(connectfour_int8_resNet_config, quantization=mode, model_path=f"models_connectfour/model_0_{mode}_int8.pt")
+        quantize_model(game, float_config, resNet_config)
+        configs[f"int8 {mode}"] = dataclasses.replace(float_config, resNet_config=resNet_config)
+
+    states = (torch.rand((64, 3, 6, 7)) < 0.3).float()
+    float_model = ResNet(game, float_config.resNet_config)
+    float_model.load_model()
+    float_model.eval()
+    with torch.no_grad():
+        float_policy, float_value = float_model(states)
+        for name, config in configs.items():
+            # Load back through ResNet.load_model, as a player would
+            model = ResNet(game, config.resNet_config)
+            model.load_model()
+            model.eval()
+            policy, value = model(states)
+            agreement = (policy.argmax(1) == float_policy.argmax(1)).float().mean().item()
+            print(f"{name}: value error {(value - float_value).abs().mean().item():.3f}, same best move {100 * agreement:.0f}%")
+            for batch_size in (1, 8, 64):
+                batch = states[:batch_size]
+                for _ in range(10):
+                    model(batch)
+                calls = 100
+                start = time.time()
+                for _ in range(calls):
+                    model(batch)
+                print(f"  batch size {batch_size}: {1000 * (time.time() - start) / calls:.2f} ms/call")
+
+    # Head-to-head games from random two-move openings, with colours alternating
+    num_games = 20
+    for name, config in configs.items():
+        if name == "fp32": continue
+        wins, draws, losses = 0, 0, 0
+        for game_index in range(num_games):
+            game = ConnectFourBitboard()
+            for _ in range(2):
+                game.perform_move(random.choice(game.get_possible_moves()))
+            quantized_player = Player.FIRST if game_index % 2 == 0 else Player.SECOND
+            if quantized_player == Player.FIRST:
+                runner = GameRunner(game, AlphaZeroModel(config), AlphaZeroModel(float_config))
+            else:
+                runner = GameRunner(game, AlphaZeroModel(float_config), AlphaZeroModel(config))
+            winner = runner.play()
+            if winner == quantized_player: wins += 1
+            elif winner is None: draws += 1
+            else: losses += 1
+        score = (wins + draws / 2) / num_games
+        print(f"{name} vs fp32: {wins} wins, {draws} draws, {losses} losses ({100 * score:.0f}% score)")
@@ -0,0 +1,108 @@
+import json
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+
+# Fixed-capacity ring buffer of self-play samples, stored in memory-mapped .npy files in folder so it survives between iterations and runs
+# Samples are written in the order they are played, so the samples kept form one contiguous (wrapping) range ending at next_index
+# The operating system pages the arrays in and out, so the buffer can be larger than RAM
+class ReplayBuffer:
+
+    METADATA_FILE = "metadata.json"
+
+    def __init__(self, folder: str, capacity: int, state_shape: Tuple[int, ...], action_size: int, window_iterations: Optional[int] = None):
+        # window_iterations: only samples from this many most recent iterations are kept (None keeps everything that fits)
+        self.folder = folder
+        self.capacity = capacity
+        self.window_iterations = window_iterations
+        # Number of samples kept, and where the next one is written
+        self.size = 0
+        self.next_index = 0
+        self.iteration = 0
+
+        os.makedirs(folder, exist_ok=True)
+        layout = {
+            "states": ((capacity, *state_shape), np.float32),
+            "policies": ((capacity, action_size), np.float32),
+            "values": ((capacity, 1), np.float32),
+            "iterations": ((capacity,), np.int32)
+        }
+        metadata = self.load_metadata()
+        # A buffer on disk with a different layout is started over
+        resume = metadata is not None and metadata["capacity"] == capacity
+        self.arrays = {}
+        for name, (shape, dtype) in layout.items():
+            path = self.array_path(name)
+            if resume and os.path.exists(path):
+                array = np.lib.format.open_memmap(path, mode="r+")
+                if array.shape == shape and array.dtype == dtype:
+                    self.arrays[name] = array
+                    continue
+            resume = False
+            self.arrays[name] = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        if resume:
+            self.size = metadata["size"]
+            self.next_index = metadata["next_index"]
+            self.iteration = metadata["iteration"]
+        self.states = self.arrays["states"]
+        self.policies = self.arrays["policies"]
+        self.values = self.arrays["values"]
+        self.iterations = self.arrays["iterations"]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def array_path(self, name: str) -> str:
+        return os.path.join(self.folder, f"{name}.npy")
+
+    def load_metadata(self) -> Optional[dict]:
+        path = os.path.join(self.folder, self.METADATA_FILE)
+        if not os.path.exists(path): return None
+        with open(path) as file:
+            return json.load(file)
+
+    def add(self, samples: List[Tuple[np.ndarray, np.ndarray, float]]):
+        # Appends (state, policy, value) samples from the current iteration, overwriting the oldest ones when full
+        # Only the last capacity samples can be kept, so earlier ones are not written at all
+        samples = samples[-self.capacity:]
+        if len(samples) == 0: return
+        states, policies, values = zip(*samples)
+        indices = (self.next_index + np.arange(len(samples))) % self.capacity
+        self.states[indices] = np.array(states, dtype=np.float32)
+        self.policies[indices] = np.array(policies, dtype=np.float32)
+        self.values[indices, 0] = np.array(values, dtype=np.float32)
+        self.iterations[indices] = self.iteration
+        self.next_index = int((self.next_index + len(samples)) % self.capacity)
+        self.size = min(self.size + len(samples), self.capacity)
+
+    def new_iteration(self):
+        # Starts the next iteration, dropping samples that fall out of the window
+        self.iteration += 1
+        if self.window_iterations is None or self.size == 0: return
+        oldest_kept = self.iteration - self.window_iterations + 1
+        # Samples are in the order they were added, so the ones to drop are the oldest
+        kept_iterations = self.iterations[self.indices(np.arange(self.size))]
+        self.size -= int(np.searchsorted(kept_iterations, oldest_kept))
+
+    def indices(self, positions: np.ndarray) -> np.ndarray:
+        # Maps positions 0..size-1 (oldest first) to indices in the arrays
+        return (self.next_index - self.size + positions) % self.capacity
+
+    def get(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Reads the states, policies and values at the given array indices
+        return self.states[indices], self.policies[indices], self.values[indices]
+
+    def sample(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # A minibatch drawn uniformly (with replacement) from the samples kept, independent of the buffer's size
+        return self.get(self.indices(np.random.randint(0, self.size, batch_size)))
+
+    def flush(self):
+        # Writes the arrays and the metadata to disk
+        for array in self.arrays.values():
+            array.flush()
+        metadata = {"capacity": self.capacity, "size": self.size, "next_index": self.next_index, "iteration": self.iteration}
+        path = os.path.join(self.folder, self.METADATA_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(metadata, file)
+        # Replace atomically, so an interrupted run never leaves metadata that does not match the arrays
+        os.replace(path + ".tmp", path)
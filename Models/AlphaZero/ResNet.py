@@ -1,10 +1,14 @@
+import os
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.ao.quantization as quantization
 
 from Games.Game import Game
 from Models.AlphaZero.ResNetConfig import ResNetConfig
 
+QUANTIZATION_MODES = ("dynamic", "static")
+
 class ResNet(nn.Module):
     def __init__(self, game: Game, config: ResNetConfig):
         super().__init__()
@@ -14,6 +18,16 @@ class ResNet(nn.Module):
         num_hidden = config.num_hidden
         self.device = config.device
         self.model_path = config.model_path
+        self.best_model_path = config.best_model_path
+        self.load_best_model = config.load_best_model
+        self.quantization = config.quantization
+        # Bumped whenever the weights change, so caches of the network's outputs know to drop them (see EvaluationCache)
+        self.weights_version = 0
+
+        # Mark where the network's input and outputs convert between float and int8 once it is quantized (identities until then)
+        self.quant = quantization.QuantStub()
+        self.dequant_policy = quantization.DeQuantStub()
+        self.dequant_value = quantization.DeQuantStub()
 
         self.startBlock = nn.Sequential(
             nn.Conv2d(3, num_hidden, kernel_size=3, padding=1),
@@ -45,15 +59,58 @@ class ResNet(nn.Module):
         self.to(self.device)
         
     def forward(self, x):
+        x = self.quant(x)
         x = self.startBlock(x)
         for resBlock in self.backBone:
             x = resBlock(x)
-        policy = self.policyHead(x)
-        value = self.valueHead(x)
+        policy = self.dequant_policy(self.policyHead(x))
+        value = self.dequant_value(self.valueHead(x))
         return policy, value
     
+    def weights_changed(self):
+        # Call after changing the weights other than through load_state_dict or quantize, e.g. after an optimizer step
+        self.weights_version += 1
+
+    def load_state_dict(self, *args, **kwargs):
+        result = super().load_state_dict(*args, **kwargs)
+        self.weights_changed()
+        return result
+
     def load_model(self):
-        self.load_state_dict(torch.load(self.model_path, map_location=self.device))
+        # A quantized model is saved with the structure of the quantized network, so that structure is set up before loading
+        if self.quantization is not None:
+            self.quantize(self.quantization)
+        path = self.model_path
+        if self.load_best_model and self.best_model_path is not None and os.path.exists(self.best_model_path):
+            path = self.best_model_path
+        self.load_state_dict(torch.load(path, map_location=self.device))
+        print(f"Loaded {path}")
+
+    def quantize(self, mode: str, calibration_states: torch.Tensor = None):
+        # Converts the network to int8 in place, for inference on the CPU
+        # "dynamic" quantizes the Linear layers of the policy and value heads only, with their activations quantized on the fly;
+        # the convolutional trunk, where most of the computation is, stays float
+        # "static" also quantizes the convolutions, with activation ranges measured by running the calibration states through the network
+        assert mode in QUANTIZATION_MODES
+        self.eval()
+        self.device = torch.device("cpu")
+        self.to(self.device)
+        self.quantization = mode
+        self.weights_changed()
+        if mode == "dynamic":
+            quantization.quantize_dynamic(self, {nn.Linear}, dtype=torch.qint8, inplace=True)
+            return
+        for sequential in (self.startBlock, self.policyHead, self.valueHead):
+            quantization.fuse_modules(sequential, ["0", "1", "2"], inplace=True)
+        for resBlock in self.backBone:
+            quantization.fuse_modules(resBlock, [["conv1", "bn1"], ["conv2", "bn2"]], inplace=True)
+        self.qconfig = quantization.get_default_qconfig(torch.backends.quantized.engine)
+        quantization.prepare(self, inplace=True)
+        if calibration_states is not None:
+            with torch.no_grad():
+                for batch in calibration_states.split(64):
+                    self(batch.to(self.device))
+        quantization.convert(self, inplace=True)
     
         
 class ResBlock(nn.Module):
@@ -63,13 +120,14 @@ class ResBlock(nn.Module):
         self.bn1 = nn.BatchNorm2d(num_hidden)
         self.conv2 = nn.Conv2d(num_hidden, num_hidden, kernel_size=3, padding=1)
         self.bn2 = nn.BatchNorm2d(num_hidden)
+        # The residual connection as a module, so it can be quantized
+        self.skip_add = nn.quantized.FloatFunctional()
         
     def forward(self, x):
         residual = x
         x = F.relu(self.bn1(self.conv1(x)))
         x = self.bn2(self.conv2(x))
-        x += residual
-        x = F.relu(x)
+        x = self.skip_add.add_relu(x, residual)
         return x
     
 class ResBlock(nn.Module):
@@ -79,12 +137,13 @@ class ResBlock(nn.Module):
         self.bn1 = nn.BatchNorm2d(num_hidden)
         self.conv2 = nn.Conv2d(num_hidden, num_hidden, kernel_size=3, padding=1)
         self.bn2 = nn.BatchNorm2d(num_hidden)
+        # The residual connection as a module, so it can be quantized
+        self.skip_add = nn.quantized.FloatFunctional()
         
     def forward(self, x):
         residual = x
         x = F.relu(self.bn1(self.conv1(x)))
         x = self.bn2(self.conv2(x))
-        x += residual
-        x = F.relu(x)
+        x = self.skip_add.add_relu(x, residual)
         return x
     
\ No newline at end of file
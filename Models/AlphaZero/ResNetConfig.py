@@ -1,5 +1,6 @@
 import torch
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Optional
 
 @dataclass
 class ResNetConfig:
@@ -8,13 +9,29 @@ class ResNetConfig:
 	device: torch.device
 	models_folder: str
 	model_path: str
+	# Where training saves the checkpoint that won its gating games (see Gating.py)
+	best_model_path: Optional[str] = None
+	# Whether load_model loads the checkpoint at best_model_path instead of model_path, when it exists
+	load_best_model: bool = False
+	# None for a float model, or the mode of the int8 model at model_path ("dynamic" or "static", see ResNet.quantize)
+	quantization: Optional[str] = None
 
 connectfour_resNet_config = ResNetConfig(
 	num_resBlocks = 2,
 	num_hidden = 128,
 	device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
 	models_folder = "models_connectfour",
-	model_path = "models_connectfour/model_0.pt"
+	model_path = "models_connectfour/model_0.pt",
+	best_model_path = "models_connectfour/best_model.pt"
+)
+
+# The ConnectFour network quantized to int8, which runs on the CPU
+# The model file is not tracked by git: generate it with python -m Models.AlphaZero.Quantization (or quantize_model)
+connectfour_int8_resNet_config = replace(
+	connectfour_resNet_config,
+	device = torch.device("cpu"),
+	model_path = "models_connectfour/model_0_static_int8.pt",
+	quantization = "static"
 )
 
 chess_resNet_config = ResNetConfig(
@@ -22,5 +39,6 @@ chess_resNet_config = ResNetConfig(
 	num_hidden = 128,
 	device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
 	models_folder = "models_chess",
-	model_path = "models_chess/model_0.pt"
+	model_path = "models_chess/model_0.pt",
+	best_model_path = "models_chess/best_model.pt"
 )
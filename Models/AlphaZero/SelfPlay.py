@@ -0,0 +1,260 @@
+import dataclasses
+import multiprocessing
+import queue
+import random
+import time
+import traceback
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from Games.Game import Game, Player, Move
+from Models.AlphaZero.AlphaMCTS import AlphaMCTS
+from Models.AlphaZero.ResNet import ResNet
+from Models.AlphaZero.EvaluationCache import EvaluationCache
+from Models.AlphaZero.AlphaZeroConfig import AlphaZeroConfig
+
+# A training sample: (encoded state, MCTS action probabilities, outcome of the game for the first player)
+Sample = Tuple[np.ndarray, np.ndarray, int]
+
+def sample_move(state: Game, action_probs: np.ndarray) -> Move:
+	# Samples a move in proportion to the search's action probabilities
+	if np.sum(action_probs) > 0:
+		action_index = np.random.choice(state.get_action_size(), p=action_probs)
+		return state.get_move_by_index(action_index)
+	return random.choice(state.get_possible_moves())
+
+def game_samples(memory: List[Tuple[Game, np.ndarray, Player]], value: float) -> List[Sample]:
+	# Labels every position of a finished game with its outcome
+	returnMemory = []
+	for hist_state, hist_action_probs, hist_player in memory:
+		if value > 0: value = 1
+		elif value < 0: value = -1
+		hist_outcome = value
+		returnMemory.append((
+			hist_state.get_neural_net_description_of_state(),
+			hist_action_probs,
+			hist_outcome
+		))
+	return returnMemory
+
+def mirror_samples(samples: List[Sample]) -> List[Sample]:
+	# Adds the left-right mirror image of each sample, for games where that is an equivalent position (see Game.is_mirror_symmetric)
+	mirrored = [(np.ascontiguousarray(state[..., ::-1]), np.ascontiguousarray(action_probs[::-1]), outcome) for state, action_probs, outcome in samples]
+	return samples + mirrored
+
+def self_play_game(game: Game, mcts: AlphaMCTS) -> List[Sample]:
+	# Plays one game from the given position against itself, sampling moves from the search's action probabilities
+	memory = []
+	player = game.get_current_player()
+	state = game
+
+	while True:
+		# print(state.get_display_text())
+		action_probs = mcts.search(state)
+
+		memory.append((state, action_probs, player))
+
+		move = sample_move(state, action_probs)
+
+		state = state.get_copy()
+		state.perform_move(move)
+		mcts.advance_root(move)
+
+		value, is_terminal = state.get_value_and_terminated()
+
+		if is_terminal:
+			return game_samples(memory, value)
+
+		# Switch player turn
+		player = Player.SECOND if player == Player.FIRST else Player.FIRST
+
+def self_play_games_vectorized(game: Game, model: ResNet, config: AlphaZeroConfig, num_games: int, cache: Optional[EvaluationCache] = None) -> List[List[Sample]]:
+	# Plays num_games games from the given position in lockstep, each with its own search tree
+	# Every simulation step selects one leaf in each game that is still searching, and all of them are evaluated in a single forward pass,
+	# so the network sees batches of up to num_games positions even though each tree is searched one simulation at a time
+	# Returns the samples of each game
+	# The games share one evaluation cache, cache if given (so it is kept across calls)
+	if cache is None and config.evaluation_cache_size > 0:
+		cache = EvaluationCache(config.evaluation_cache_size, config.mirror_inference)
+	searches = [AlphaMCTS(game, model, config, cache) for _ in range(num_games)]
+	states = [game.get_copy() for _ in range(num_games)]
+	memories = [[] for _ in range(num_games)]
+	results: List[Optional[List[Sample]]] = [None] * num_games
+	playing = list(range(num_games))
+
+	while len(playing) > 0:
+		remaining = {i: searches[i].start_search(states[i]) for i in playing}
+		while len(remaining) > 0:
+			leaves, encoded_states = [], []
+			for i in list(remaining):
+				mcts = searches[i]
+				node, depth = mcts.select_leaf()
+				value = mcts.terminal_value()
+				if value is None:
+					key, evaluation = mcts.lookup()
+					if evaluation is None:
+						encoded_states.append(mcts.scratch.get_neural_net_description_of_state())
+						leaves.append((i, node, mcts.scratch.get_possible_moves(), key))
+					else:
+						policy, value = evaluation
+						node.expand(policy, mcts.scratch, mcts.scratch.get_possible_moves())
+				if value is not None:
+					mcts.backpropagate(node, value)
+				mcts.undo_moves(depth)
+				remaining[i] -= 1
+				if remaining[i] == 0:
+					del remaining[i]
+			if len(leaves) == 0: continue
+
+			policies, values = searches[0].evaluate(encoded_states)
+			for (i, node, possible_moves, key), policy, value in zip(leaves, policies, values):
+				searches[i].store(key, policy, float(value))
+				node.expand(policy, searches[i].scratch, possible_moves)
+				searches[i].backpropagate(node, float(value))
+
+		for i in list(playing):
+			state = states[i]
+			action_probs = searches[i].action_probs()
+			memories[i].append((state, action_probs, state.get_current_player()))
+
+			move = sample_move(state, action_probs)
+			state = state.get_copy()
+			state.perform_move(move)
+			searches[i].advance_root(move)
+			states[i] = state
+
+			value, is_terminal = state.get_value_and_terminated()
+			if is_terminal:
+				results[i] = game_samples(memories[i], value)
+				playing.remove(i)
+	return results
+
+def play_games(game: Game, model: ResNet, mcts: AlphaMCTS, config: AlphaZeroConfig, num_games: int) -> Iterator[List[Sample]]:
+	# Yields the samples of num_games self-play games, played config.num_parallel_games at a time
+	# All the games use mcts's evaluation cache
+	if config.num_parallel_games > 1:
+		for first_game in range(0, num_games, config.num_parallel_games):
+			yield from self_play_games_vectorized(game, model, config, min(config.num_parallel_games, num_games - first_game), mcts.cache)
+	else:
+		for _game in range(num_games):
+			yield self_play_game(game, mcts)
+
+# Seconds the trainer waits for a self-play worker's message before checking that the workers are still alive
+WORKER_POLL_INTERVAL = 5.0
+
+def cpu_config(config: AlphaZeroConfig) -> AlphaZeroConfig:
+	# The same config with the network on the CPU
+	return dataclasses.replace(config, resNet_config=dataclasses.replace(config.resNet_config, device=torch.device("cpu")))
+
+def self_play_config(config: AlphaZeroConfig) -> AlphaZeroConfig:
+	# The same config with the search batched and cached as configured for self-play
+	return dataclasses.replace(config, search_batch_size=config.selfPlay_search_batch_size, evaluation_cache_size=config.selfPlay_evaluation_cache_size)
+
+def self_play_worker(worker_id: int, game: Game, config: AlphaZeroConfig, state_dict: Dict[str, Any], num_games: int, seed: int, sample_queue):
+	# Runs in its own process: plays num_games games with a snapshot of the network weights,
+	# putting (worker_id, samples) on the queue after each game and (worker_id, None) when done
+	# If it fails, it puts (worker_id, traceback text) before the final (worker_id, None)
+	try:
+		torch.set_num_threads(1)
+		random.seed(seed)
+		np.random.seed(seed)
+		torch.manual_seed(seed)
+
+		config = self_play_config(cpu_config(config))
+		model = ResNet(game, config.resNet_config)
+		model.load_state_dict(state_dict)
+		model.eval()
+		mcts = AlphaMCTS(game, model, config)
+		for samples in play_games(game, model, mcts, config, num_games):
+			sample_queue.put((worker_id, samples))
+	except Exception:
+		sample_queue.put((worker_id, traceback.format_exc()))
+	finally:
+		sample_queue.put((worker_id, None))
+
+def drain_queue(sample_queue) -> List[Tuple[int, Any]]:
+	# Returns every message already on the queue without waiting for more
+	messages = []
+	while True:
+		try:
+			messages.append(sample_queue.get_nowait())
+		except queue.Empty:
+			return messages
+
+def terminate_workers(workers: List[multiprocessing.Process]):
+	for worker in workers:
+		if worker.is_alive():
+			worker.terminate()
+
+def run_self_play_workers(game: Game, config: AlphaZeroConfig, state_dict: Dict[str, Any], num_games: int, seed: int) -> Tuple[List[Sample], float]:
+	# Plays num_games games spread over config.num_selfPlay_workers processes, all on the CPU
+	# Worker i is seeded with seed + i, so a run is reproducible per worker
+	# Returns the samples of all games and the throughput in games per minute
+	num_workers = config.num_selfPlay_workers
+	state_dict = {name: tensor.detach().cpu() for name, tensor in state_dict.items()}
+	# Spawn rather than fork, as forked processes cannot use CUDA or safely share PyTorch's thread pools
+	context = multiprocessing.get_context("spawn")
+	sample_queue = context.Queue()
+	workers = []
+	for worker_id in range(num_workers):
+		worker_games = num_games // num_workers + (1 if worker_id < num_games % num_workers else 0)
+		worker = context.Process(
+			target=self_play_worker,
+			args=(worker_id, game, config, state_dict, worker_games, seed + worker_id, sample_queue),
+			daemon=True
+		)
+		worker.start()
+		workers.append(worker)
+
+	start = time.time()
+	memory = []
+	finished_workers = set()
+	with tqdm(total=num_games, desc="Self-play") as progress:
+		# Drain the queue before joining, or workers blocked on a full queue would never exit
+		while len(finished_workers) < num_workers:
+			try:
+				messages = [sample_queue.get(timeout=WORKER_POLL_INTERVAL)]
+			except queue.Empty:
+				# A worker's messages are flushed before it exits, but can still be in the pipe when get times out
+				messages = drain_queue(sample_queue)
+				if not messages:
+					# The queue is empty, so a worker that exited without its final message was killed
+					for worker_id, worker in enumerate(workers):
+						if worker.exitcode is not None and worker_id not in finished_workers:
+							terminate_workers(workers)
+							raise RuntimeError(f"Self-play worker {worker_id} exited with code {worker.exitcode} before finishing its games")
+					continue
+			for worker_id, samples in messages:
+				if samples is None:
+					finished_workers.add(worker_id)
+					continue
+				if isinstance(samples, str):
+					terminate_workers(workers)
+					raise RuntimeError(f"Self-play worker {worker_id} failed:\n{samples}")
+				memory += samples
+				progress.update(1)
+				progress.set_postfix(games_per_minute=f"{60 * progress.n / (time.time() - start):.1f}")
+	for worker in workers:
+		worker.join()
+	games_per_minute = 60 * num_games / (time.time() - start)
+	return memory, games_per_minute
+
+if __name__ == "__main__":
+	# Compare the games per minute of one game at a time and of games played in lockstep
+	from Games.ConnectFourBitboard import ConnectFourBitboard
+	from Models.AlphaZero.AlphaZeroConfig import connectfour_config
+
+	game = ConnectFourBitboard()
+	model = ResNet(game, connectfour_config.resNet_config)
+	model.eval()
+	num_games = 32
+	for num_parallel_games in (1, 8, 32):
+		config = dataclasses.replace(connectfour_config, num_searches=50, num_parallel_games=num_parallel_games)
+		mcts = AlphaMCTS(game, model, config)
+		start = time.time()
+		for _samples in play_games(game, model, mcts, config, num_games):
+			pass
+		elapsed = time.time() - start
+		print(f"num_parallel_games {num_parallel_games}: {60 * num_games / elapsed:.1f} games/minute")
@@ -0,0 +1,254 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+from Games.Game import Game, Player, Move
+from Models.Model import Model
+from Models.MCTS import random_playout
+
+NO_NODE = -1
+
+# Stores an MCTS tree in preallocated arrays instead of one Python object per node
+# Node i has visit_counts[i], win_counts[i], parent[i], the move that led to it (moves[i]) and the player to move (next_player[i])
+# The children of a node are allocated together (in random order), so they are the contiguous slice first_child[i]:first_child[i] + num_children[i]
+# (first_child is NO_NODE until the node is expanded), and the first num_visited[i] of them have been visited
+class NodePool:
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.capacity = 0
+        self.visit_counts = np.zeros(0, dtype=np.int64)
+        self.win_counts = np.zeros(0, dtype=np.int64)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.first_child = np.zeros(0, dtype=np.int32)
+        self.num_children = np.zeros(0, dtype=np.int32)
+        self.num_visited = np.zeros(0, dtype=np.int32)
+        self.next_player = np.zeros(0, dtype=np.int8)
+        self.moves = np.empty(0, dtype=object)
+        self.grow(capacity)
+
+    def grow(self, capacity: int):
+        def resize(array: np.ndarray) -> np.ndarray:
+            resized = np.empty(capacity, dtype=array.dtype)
+            resized[:self.size] = array[:self.size]
+            return resized
+        self.visit_counts = resize(self.visit_counts)
+        self.win_counts = resize(self.win_counts)
+        self.parent = resize(self.parent)
+        self.first_child = resize(self.first_child)
+        self.num_children = resize(self.num_children)
+        self.num_visited = resize(self.num_visited)
+        self.next_player = resize(self.next_player)
+        self.moves = resize(self.moves)
+        self.capacity = capacity
+
+    def allocate(self, count: int, parent: int, next_player: Player, moves: List[Optional[Move]]) -> int:
+        # Allocates count nodes with the given parent, returns the index of the first one
+        if self.size + count > self.capacity:
+            # Grow geometrically so allocation stays amortized O(1)
+            self.grow(max(2 * self.capacity, self.size + count))
+        start, end = self.size, self.size + count
+        self.visit_counts[start:end] = 0
+        self.win_counts[start:end] = 0
+        self.parent[start:end] = parent
+        self.first_child[start:end] = NO_NODE
+        self.num_children[start:end] = 0
+        self.num_visited[start:end] = 0
+        self.next_player[start:end] = next_player.value
+        self.moves[start:end] = moves
+        self.size = end
+        return start
+
+    def reset(self):
+        self.moves[:self.size] = None
+        self.size = 0
+
+    def keep_subtree(self, root: int):
+        # Moves the subtree under root to the front of the arrays (root becomes node 0) and frees everything else
+        # Nodes are gathered level by level, which keeps each node's children contiguous
+        levels = [np.array([root])]
+        frontier = levels[0]
+        while True:
+            first_child = self.first_child[frontier]
+            num_children = self.num_children[frontier]
+            expanded = first_child != NO_NODE
+            first_child, num_children = first_child[expanded], num_children[expanded]
+            total = num_children.sum()
+            if total == 0: break
+            # Concatenate the ranges first_child[i]:first_child[i] + num_children[i]
+            frontier = np.repeat(first_child - (np.cumsum(num_children) - num_children), num_children) + np.arange(total)
+            levels.append(frontier)
+        kept = np.concatenate(levels)
+
+        new_index = np.full(self.size, NO_NODE, dtype=np.int32)
+        new_index[kept] = np.arange(len(kept))
+        count = len(kept)
+        parent = self.parent[kept]
+        first_child = self.first_child[kept]
+        num_children = self.num_children[kept]
+        # Nodes without moves (game over) keep their first_child, which only marks them as expanded
+        has_children = num_children > 0
+        first_child[has_children] = new_index[first_child[has_children]]
+        self.visit_counts[:count] = self.visit_counts[kept]
+        self.win_counts[:count] = self.win_counts[kept]
+        self.num_children[:count] = num_children
+        self.num_visited[:count] = self.num_visited[kept]
+        self.next_player[:count] = self.next_player[kept]
+        self.moves[:count] = self.moves[kept]
+        self.parent[:count] = np.where(parent != NO_NODE, new_index[parent], NO_NODE)
+        self.parent[0] = NO_NODE
+        self.first_child[:count] = first_child
+        self.moves[count:self.size] = None
+        self.size = count
+
+# The same algorithm as MCTS, storing the tree in a NodePool
+# When the root advances in take_move, the subtree that is kept is compacted to the front of the pool and the rest is recycled
+class ArrayMCTS(Model):
+
+    ROOT = 0
+
+    def __init__(self, iterations_per_move: int = 500, exploration_param: float = math.sqrt(2)):
+        self.game: Game = None
+        self.player: Player = None
+        self.iterations_per_move = iterations_per_move
+        self.exploration_param = exploration_param
+        self.pool = NodePool()
+        # Statistics about the most recent move
+        self.stats: Dict[str, float] = {}
+
+    def set_game_and_player(self, game: Game, player: Player):
+        self.game = game
+        self.player = player
+        self.new_root(player)
+
+    def new_root(self, player: Player):
+        self.pool.reset()
+        self.pool.allocate(1, NO_NODE, player, [None])
+
+    def child_with_move(self, node: int, move: Move) -> int:
+        first_child = self.pool.first_child[node]
+        if first_child == NO_NODE: return NO_NODE
+        for child in range(first_child, first_child + self.pool.num_children[node]):
+            if self.pool.moves[child] == move:
+                return child
+        return NO_NODE
+
+    def take_move(self):
+        assert(self.game.get_current_player() == self.player)
+        self.apply_opponent_move()
+        # Iterations
+        start = time.time()
+        for _ in range(self.iterations_per_move):
+            self.do_iteration()
+        self.update_stats(self.iterations_per_move, time.time() - start)
+        # Select
+        self.play_move(self.pool.moves[self.most_visited_child()])
+
+    def run_search(self):
+        # Anytime search: iterations until the deadline or stop(), always running at least one
+        self.apply_opponent_move()
+        start = time.time()
+        iterations = 0
+        while iterations == 0 or not self.search_should_stop():
+            self.do_iteration()
+            iterations += 1
+            self.best_move = self.pool.moves[self.most_visited_child()]
+        self.update_stats(iterations, time.time() - start)
+
+    def apply_opponent_move(self):
+        opp_move = self.game.get_opponent_move()
+        if opp_move:
+            child = self.child_with_move(self.ROOT, opp_move)
+            if child != NO_NODE:
+                self.pool.keep_subtree(child)
+            else:
+                self.new_root(self.player)
+
+    def update_stats(self, iterations: int, elapsed: float):
+        self.stats = {
+            "iterations": iterations,
+            "iterations_per_second": iterations / elapsed if elapsed > 0 else 0.0,
+            "nodes": self.pool.size
+        }
+
+    def most_visited_child(self) -> int:
+        first_child = self.pool.first_child[self.ROOT]
+        children = slice(first_child, first_child + self.pool.num_children[self.ROOT])
+        return first_child + int(np.argmax(self.pool.visit_counts[children]))
+
+    def play_move(self, move: Move):
+        self.pool.keep_subtree(self.child_with_move(self.ROOT, move))
+        self.game.perform_move(move)
+
+    def expand(self, node: int):
+        moves = self.game.get_possible_moves()
+        random.shuffle(moves)
+        next_player = Player.SECOND if self.pool.next_player[node] == Player.FIRST.value else Player.FIRST
+        first_child = self.pool.allocate(len(moves), node, next_player, moves)
+        self.pool.first_child[node] = first_child
+        self.pool.num_children[node] = len(moves)
+
+    def do_iteration(self):
+        pool = self.pool
+        undo_count = 0
+        # Selection and expansion
+        node = self.ROOT
+        while True:
+            if pool.first_child[node] == NO_NODE:
+                self.expand(node)
+            num_children = pool.num_children[node]
+            if num_children == 0: break # Game over
+            first_child = pool.first_child[node]
+            num_visited = pool.num_visited[node]
+            if num_visited < num_children:
+                # Expand the next unvisited child (children are in random order)
+                pool.num_visited[node] = num_visited + 1
+                node = first_child + num_visited
+                undo_count += 1
+                self.game.perform_move(pool.moves[node])
+                break
+            node = first_child + self.best_child_offset(node, first_child, num_children)
+            undo_count += 1
+            self.game.perform_move(pool.moves[node])
+        # Simulation
+        winner = random_playout(self.game)
+        # Backpropagation
+        winner_value = winner.value if winner is not None else NO_NODE
+        while node != NO_NODE:
+            pool.visit_counts[node] += 1
+            if pool.next_player[node] == winner_value:
+                pool.win_counts[node] += 1
+            node = pool.parent[node]
+        for _ in range(undo_count):
+            self.game.undo_move()
+
+    def best_child_offset(self, node: int, first_child: int, num_children: int) -> int:
+        # UCT over the slice of children, all of which have been visited
+        children = slice(first_child, first_child + num_children)
+        visit_counts = self.pool.visit_counts[children]
+        exploitation = -self.pool.win_counts[children] / visit_counts
+        exploration = np.sqrt(math.log(self.pool.visit_counts[node]) / visit_counts)
+        return int(np.argmax(exploitation + self.exploration_param * exploration))
+
+if __name__ == "__main__":
+    # Compare speed and tree size with MCTS over a few moves
+    import tracemalloc
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Models.MCTS import MCTS
+
+    for model_class in (MCTS, ArrayMCTS):
+        random.seed(0)
+        game = ConnectFourBitboard()
+        players = {player: model_class(iterations_per_move=5000) for player in Player}
+        for player, model in players.items():
+            model.set_game_and_player(game, player)
+        tracemalloc.start()
+        start = time.time()
+        for _move in range(6):
+            players[game.get_current_player()].take_move()
+        elapsed = time.time() - start
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{model_class.__name__}: {6 * 5000 / elapsed:.0f} iterations/second, peak memory {peak / 1e6:.1f} MB")
@@ -1,9 +1,16 @@
 import math
 import random
-from Games.Game import Game, Player, Move
+import threading
+import time
+from Games.Game import Game, Player, Move, random_playout
 from Models.Model import Model
 from typing import Tuple, Optional, Dict, List
 
+# Proven results of a node, for the player to play there, once the search has solved it
+PROVEN_WIN = 1
+PROVEN_DRAW = 0
+PROVEN_LOSS = -1
+
 class Node:
     def __init__(self, unexpanded_moves: List[Move], next_player_to_play: Player, parent: Optional["Node"] = None, move: Optional[Move] = None):
         self.win_count = 0
@@ -14,14 +21,35 @@ class Node:
         self.children: Dict[Move: "Node"] = {}
         self.unexpanded_moves = unexpanded_moves
         random.shuffle(unexpanded_moves)
+        # PROVEN_WIN, PROVEN_DRAW or PROVEN_LOSS once the result with best play is known, None until then
+        self.proven: Optional[int] = None
 
 class MCTS(Model):
 
-    def __init__(self, iterations_per_move: int = 500):
+    # Pondering stops after this many iterations if the opponent is still thinking, to bound the tree's memory
+    MAX_PONDER_ITERATIONS = 200_000
+
+    def __init__(self, iterations_per_move: int = 500, playouts_per_leaf: int = 1, solver: bool = True, ponder: bool = False):
+        # playouts_per_leaf random games are played out from every expanded leaf, with Game.random_playouts (all at once, for ConnectFourBitboard)
+        # With solver, game over positions get proven results that propagate up the tree (MCTS-Solver):
+        # proven subtrees are no longer searched, and the search stops once the root is solved
+        # With ponder, the tree keeps growing on a copy of the game in a background thread after each move, while the opponent thinks
+        # The subtree of the opponent's move is kept, and its visits count towards iterations_per_move
         self.game: Game = None
         self.player: Player = None
         self.root: Node = None
         self.iterations_per_move = iterations_per_move
+        self.playouts_per_leaf = playouts_per_leaf
+        self.solver = solver
+        self.ponder = ponder
+        self.ponder_thread: Optional[threading.Thread] = None
+        self.ponder_stop_requested = False
+        # The game being played, while self.game is the copy pondered on
+        self.played_game: Optional[Game] = None
+        # Deepest node selected during the current move
+        self.tree_depth = 0
+        # Statistics about the most recent move
+        self.stats: Dict[str, float] = {}
 
     def set_game_and_player(self, game: Game, player: Player):
         self.game = game
@@ -29,8 +57,38 @@ class MCTS(Model):
         self.root = Node(game.get_possible_moves(), player)
 
     def take_move(self):
+        self.stop_pondering()
         assert(self.game.get_current_player() == self.player)
-        # Apply opponent move
+        self.apply_opponent_move()
+        # Iterations
+        start = time.time()
+        self.tree_depth = 0
+        reused_visits = self.root.visit_count if self.ponder else 0
+        iterations = 0
+        while (iterations + reused_visits < self.iterations_per_move or not self.root.children) and self.root.proven is None:
+            self.do_iteration()
+            iterations += 1
+        self.update_stats(iterations, time.time() - start)
+        if self.ponder:
+            self.stats["reused_visits"] = reused_visits
+        # Select
+        self.play_move(self.best_move_child_of_node(self.root).move)
+
+    def run_search(self):
+        # Anytime search: iterations until the deadline, stop() or the root is solved, always running at least one unless it is already solved
+        self.apply_opponent_move()
+        start = time.time()
+        self.tree_depth = 0
+        iterations = 0
+        while self.root.proven is None and (iterations == 0 or not self.search_should_stop()):
+            self.do_iteration()
+            iterations += 1
+            self.best_move = self.best_move_child_of_node(self.root).move
+        self.best_move = self.best_move_child_of_node(self.root).move
+        self.update_stats(iterations, time.time() - start)
+
+    def apply_opponent_move(self):
+        # Moves the root to the opponent's move, keeping its subtree when it was searched
         opp_move = self.game.get_opponent_move()
         if opp_move:
             if opp_move in self.root.children.keys():
@@ -38,12 +96,38 @@ class MCTS(Model):
                 self.root.parent = None
             else:
                 self.root = Node(self.game.get_possible_moves(), self.player, None, opp_move)
-        # Iterations
-        for _ in range(self.iterations_per_move):
+
+    def play_move(self, move: Move):
+        # The rest of the tree is released, and pondering must not backpropagate into it
+        self.root = self.root.children[move]
+        self.root.parent = None
+        self.game.perform_move(move)
+        if self.ponder:
+            self.start_pondering()
+
+    def start_pondering(self):
+        # Grows the tree from the root (the position after this player's move) in a background thread, until stop_pondering()
+        # The search runs on a copy of the game, so the opponent can move on the game meanwhile
+        if self.ponder_thread is not None or self.game.is_game_over(): return
+        self.played_game = self.game
+        self.game = self.game.get_copy()
+        self.ponder_stop_requested = False
+        self.ponder_thread = threading.Thread(target=self.run_ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def run_ponder(self):
+        iterations = 0
+        while not self.ponder_stop_requested and self.root.proven is None and iterations < self.MAX_PONDER_ITERATIONS:
             self.do_iteration()
-        # Select
-        self.root = self.most_visited_child_of_node(self.root)
-        self.game.perform_move(self.root.move)
+            iterations += 1
+
+    def stop_pondering(self):
+        if self.ponder_thread is None: return
+        self.ponder_stop_requested = True
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        self.game = self.played_game
+        self.played_game = None
 
     def do_iteration(self):
         undo_count = 0
@@ -58,29 +142,60 @@ class MCTS(Model):
             move = node.unexpanded_moves.pop()
             undo_count += 1
             self.game.perform_move(move)
+            self.tree_depth = max(self.tree_depth, undo_count)
             node = Node(self.game.get_possible_moves(), self.opposite_player(node.next_player_to_play), node, move)
             node.parent.children[move] = node
+            if self.solver and self.game.is_game_over():
+                self.prove(node)
         # Simulation
-        while not self.game.is_game_over():
-            moves = self.game.get_possible_moves()
-            move = random.choice(moves)
-            undo_count += 1
-            self.game.perform_move(move)
-        winner = self.game.get_winner()
+        winners = self.simulate()
         # Backpropagation
         while node:
-            node.visit_count += 1
-            if node.next_player_to_play == winner:
-                node.win_count += 1
+            node.visit_count += len(winners)
+            node.win_count += winners.count(node.next_player_to_play)
             node = node.parent
         for _ in range(undo_count):
             self.game.undo_move()
 
+    def simulate(self) -> List[Optional[Player]]:
+        # Plays out the game from the current position, returning the winner of each playout
+        if self.playouts_per_leaf == 1:
+            return [random_playout(self.game)]
+        return self.game.random_playouts(self.playouts_per_leaf)
+
+    def prove(self, node: Node):
+        # Sets the result of a game over node, then proves its ancestors as far as it decides them
+        winner = self.game.get_winner()
+        if winner is None: node.proven = PROVEN_DRAW
+        else: node.proven = PROVEN_WIN if winner == node.next_player_to_play else PROVEN_LOSS
+        node = node.parent
+        while node and node.proven is None:
+            results = [child.proven for child in node.children.values()]
+            if PROVEN_LOSS in results:
+                # A move that leaves the opponent lost wins
+                node.proven = PROVEN_WIN
+            elif len(node.unexpanded_moves) == 0 and None not in results:
+                # Every move is solved, so the best of them decides the result
+                node.proven = -min(results)
+            else:
+                return
+            node = node.parent
+
+    def update_stats(self, iterations: int, elapsed: float):
+        self.stats = {
+            "iterations": iterations,
+            "iterations_per_second": iterations / elapsed if elapsed > 0 else 0.0,
+            "depth": self.tree_depth
+        }
+        if self.solver:
+            self.stats["solved"] = self.root.proven is not None
+
     def best_child_of_node(self, node: Node) -> Node:
         exploration_param = math.sqrt(2)
         best_score = -1
         best_child = None
         for child in node.children.values():
+            if child.proven is not None: continue
             exploitation = -child.win_count / child.visit_count
             exploration = math.sqrt(math.log(node.visit_count) / child.visit_count)
             score = exploitation + exploration_param * exploration
@@ -98,6 +213,60 @@ class MCTS(Model):
                 most_visited_child = child
         return most_visited_child
 
+    def best_move_child_of_node(self, node: Node) -> Node:
+        # The child to move to: a proven result when one is known, the most visited child otherwise
+        results = {child.proven for child in node.children.values()}
+        for result in (PROVEN_LOSS, PROVEN_DRAW):
+            if result in results and node.proven == -result:
+                return max((child for child in node.children.values() if child.proven == result), key=lambda child: child.visit_count)
+        # Avoid moves proven to lose, unless every move does
+        unlost = [child for child in node.children.values() if child.proven != PROVEN_WIN]
+        if len(unlost) == 0: return self.most_visited_child_of_node(node)
+        return max(unlost, key=lambda child: child.visit_count)
+
     def opposite_player(self, player: Player) -> Player:
         if player == Player.FIRST: return Player.SECOND
         else: return Player.FIRST
+
+if __name__ == "__main__":
+    # Compare playouts per second of the move-by-move playout and of vectorized playouts, and their effect on MCTS
+    import numpy as np
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+
+    random.seed(0)
+    np.random.seed(0)
+    game = ConnectFourBitboard()
+    num_playouts = 2000
+    start = time.time()
+    for _ in range(num_playouts):
+        random_playout(game)
+    print(f"random_playout: {num_playouts / (time.time() - start):.0f} playouts/second")
+    for count in (8, 64, 512):
+        start = time.time()
+        for _ in range(max(1, num_playouts // count)):
+            game.random_playouts(count)
+        print(f"random_playouts, {count} at once: {max(1, num_playouts // count) * count / (time.time() - start):.0f} playouts/second")
+    for playouts_per_leaf in (1, 64):
+        model = MCTS(iterations_per_move=500, playouts_per_leaf=playouts_per_leaf)
+        model.set_game_and_player(ConnectFourBitboard(), Player.FIRST)
+        model.take_move()
+        print(f"MCTS with {playouts_per_leaf} playouts per leaf: {model.stats['iterations_per_second'] * playouts_per_leaf:.0f} playouts/second")
+    # Iterations and move time late in games, with and without the solver
+    for solver in (False, True):
+        random.seed(0)
+        iterations, move_times = [], []
+        for _ in range(10):
+            game = ConnectFourBitboard()
+            players = {player: MCTS(solver=solver) for player in Player}
+            for player, model in players.items():
+                model.set_game_and_player(game, player)
+            num_moves = 0
+            while not game.is_game_over():
+                model = players[game.get_current_player()]
+                start = time.time()
+                model.take_move()
+                num_moves += 1
+                if num_moves > 20:
+                    move_times.append(time.time() - start)
+                    iterations.append(model.stats["iterations"])
+        print(f"MCTS {'with' if solver else 'without'} solver after move 20: {np.mean(iterations):.0f} iterations, {1000 * np.mean(move_times):.1f} ms per move")
@@ -1,56 +1,258 @@
 import random
+import time
 from Games.Game import Game, Player, Move
 from Models.Model import Model
-from typing import Tuple, Optional
+from Models.TranspositionTable import TranspositionTable, Bound
+from Models.MoveOrdering import MoveOrdering, make_move_ordering
+from typing import Tuple, Optional, Dict, List
 
 class Minimax(Model):
 
     MAX = +10000
     MIN = -10000
 
-    def __init__(self, max_depth: int = 5):
+    # How often (in nodes) the clock is checked during a timed search
+    TIME_CHECK_INTERVAL = 256
+    # Default depth limit for iterative deepening, which normally stops on time first
+    MAX_ITERATIVE_DEPTH = 64
+
+    def __init__(self, max_depth: Optional[int] = None, time_limit: Optional[float] = None, tt_size: int = 1 << 20, tt_replacement: str = "depth", move_ordering: bool = True):
+        # Without a time_limit, every move is searched to max_depth
+        # With a time_limit (seconds per move), iterative deepening searches depth 1, 2, 3... up to max_depth
+        # and plays the best move of the deepest search that finished in time
+        # Anytime search (start_search) always uses iterative deepening, up to max_depth if it was given
+        # tt_size is the number of transposition table entries (0 disables the table)
+        # move_ordering searches likely good moves first (see MoveOrdering); without it moves are searched in random order
+        self.anytime_max_depth = max_depth if max_depth is not None else self.MAX_ITERATIVE_DEPTH
+        if max_depth is None:
+            max_depth = 5 if time_limit is None else self.MAX_ITERATIVE_DEPTH
         self.game = None
         self.player = None
         self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.transposition_table = TranspositionTable(tt_size, tt_replacement) if tt_size > 0 else None
+        self.use_move_ordering = move_ordering
+        self.move_ordering: Optional[MoveOrdering] = None
+        self.search_depth = max_depth
+        self.deadline: Optional[float] = None
+        self.aborted = False
+        self.depth_limited = False
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.moves_searched = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # pv_table[depth] is the principal variation found from the node currently being searched at that depth
+        self.pv_table: List[List[Move]] = []
+        self.previous_pv: List[Move] = []
+        # Statistics about the most recent move
+        self.stats: Dict[str, float] = {}
 
     def set_game_and_player(self, game: Game, player: Player):
         self.game = game
         self.player = player
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+        if self.use_move_ordering:
+            self.move_ordering = make_move_ordering(game)
 
     def take_move(self):
         assert(self.game.get_current_player() == self.player)
-        _, best_move = self.alphabeta(0, self.MIN, self.MAX)
+        start = time.time()
+        self.new_search()
+        if self.time_limit is None:
+            best_move, depth = self.search(self.max_depth), self.max_depth
+        else:
+            best_move, depth = self.iterative_deepening(time.time() + self.time_limit, self.max_depth)
+        self.update_stats(depth, time.time() - start)
         self.game.perform_move(best_move)
 
-    def alphabeta(self, depth, alpha, beta) -> Tuple[int, Optional[Move]]:
-        if depth >= self.max_depth or self.game.is_game_over():
+    def run_search(self):
+        # Anytime search: iterative deepening until the deadline or stop(), with best_move set after every completed depth
+        start = time.time()
+        self.new_search()
+        _, depth = self.iterative_deepening(self.search_deadline, self.anytime_max_depth)
+        self.update_stats(depth, time.time() - start)
+
+    def new_search(self):
+        # Resets the statistics and move ordering state before searching a new move
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.moves_searched = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        if self.move_ordering is not None:
+            self.move_ordering.new_search()
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+            self.transposition_table.reset_statistics()
+
+    def search(self, depth: int, on_pv: bool = False) -> Optional[Move]:
+        # Runs one alphabeta search to the given depth, returns None if it ran out of time
+        self.search_depth = depth
+        self.aborted = False
+        self.depth_limited = False
+        self.pv_table = [[] for _ in range(depth + 1)]
+        _, best_move = self.alphabeta(0, self.MIN, self.MAX, on_pv)
+        return None if self.aborted else best_move
+
+    def iterative_deepening(self, deadline: float, max_depth: int) -> Tuple[Move, int]:
+        self.previous_pv = []
+        best_move = None
+        completed_depth = 0
+        for depth in range(1, max_depth + 1):
+            # The first iteration always runs to completion, so there is a move to play
+            self.deadline = deadline if completed_depth > 0 else None
+            move = self.search(depth, on_pv=True)
+            if move is None: break
+            best_move = move
+            completed_depth = depth
+            self.best_move = move
+            self.previous_pv = self.pv_table[0]
+            # Stop early once the search reached the end of every line
+            if not self.depth_limited: break
+            if time.time() >= deadline or self.stop_requested: break
+        self.deadline = None
+        return best_move, completed_depth
+
+    def update_stats(self, depth: int, elapsed: float):
+        self.stats = {"nodes": self.nodes, "depth": depth, "nodes_per_second": self.nodes / elapsed if elapsed > 0 else 0.0}
+        # Average number of moves searched per interior node, which good ordering brings down through earlier cutoffs
+        self.stats["branching_factor"] = self.moves_searched / self.interior_nodes if self.interior_nodes > 0 else 0.0
+        # Fraction of cutoffs caused by the first move searched
+        self.stats["first_move_cutoff_rate"] = self.first_move_cutoffs / self.cutoffs if self.cutoffs > 0 else 0.0
+        if self.transposition_table is not None:
+            self.stats["tt_probes"] = self.transposition_table.probes
+            self.stats["tt_hits"] = self.transposition_table.hits
+            self.stats["tt_hit_rate"] = self.transposition_table.hit_rate()
+
+    def alphabeta(self, depth, alpha, beta, on_pv = False) -> Tuple[int, Optional[Move]]:
+        # on_pv is true while following the principal variation of the previous iteration
+        self.nodes += 1
+        self.pv_table[depth] = []
+        if self.deadline is not None and self.nodes % self.TIME_CHECK_INTERVAL == 0 and (time.time() >= self.deadline or self.stop_requested):
+            self.aborted = True
+        if self.aborted:
+            return 0, None
+        if self.game.is_game_over():
             return self.game.get_heuristic(), None
+        if depth >= self.search_depth:
+            self.depth_limited = True
+            return self.game.get_heuristic(), None
+
+        # Reuse the result of an earlier search of this position, if it went at least as deep
+        remaining_depth = self.search_depth - depth
+        tt_move = None
+        if self.transposition_table is not None:
+            key = self.game.get_hash()
+            entry = self.transposition_table.probe(key)
+            if entry is not None:
+                tt_move = entry.best_move
+                if entry.depth >= remaining_depth:
+                    # The stored search may have been cut off by depth, so do not treat this line as finished
+                    self.depth_limited = True
+                    if entry.bound == Bound.EXACT:
+                        return entry.value, entry.best_move
+                    elif entry.bound == Bound.LOWER:
+                        alpha = max(alpha, entry.value)
+                    else:
+                        beta = min(beta, entry.value)
+                    if alpha >= beta:
+                        return entry.value, entry.best_move
+        original_alpha, original_beta = alpha, beta
+
+        self.interior_nodes += 1
         current_player = self.game.get_current_player()
         moves = self.game.get_possible_moves()
-        random.shuffle(moves)
+        if self.move_ordering is not None:
+            moves = self.move_ordering.order_moves(self.game, moves, depth)
+        else:
+            random.shuffle(moves)
+        # Search the best move from the earlier search first, as it is the most likely to cause a cutoff
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        # The previous iteration's principal variation goes before everything else
+        pv_move = self.previous_pv[depth] if on_pv and depth < len(self.previous_pv) else None
+        if pv_move is not None and pv_move in moves:
+            moves.remove(pv_move)
+            moves.insert(0, pv_move)
         if current_player == Player.FIRST:
             value = self.MIN
             best_move = moves[0]
             for move in moves:
                 self.game.perform_move(move)
-                score, _ = self.alphabeta(depth + 1, alpha, beta)
+                score, _ = self.alphabeta(depth + 1, alpha, beta, move == pv_move)
                 self.game.undo_move()
+                if self.aborted: break
+                self.moves_searched += 1
                 if score > value:
                     value = score
                     best_move = move
+                    self.pv_table[depth] = [move] + self.pv_table[depth + 1]
                 alpha = max(alpha, value)
-                if alpha >= beta: break
-            return value, best_move
+                if alpha >= beta:
+                    self.record_cutoff(move, depth, remaining_depth, move is moves[0])
+                    break
         else:
             value = self.MAX
             best_move = moves[0]
             for move in moves:
                 self.game.perform_move(move)
-                score, _ = self.alphabeta(depth + 1, alpha, beta)
+                score, _ = self.alphabeta(depth + 1, alpha, beta, move == pv_move)
                 self.game.undo_move()
+                if self.aborted: break
+                self.moves_searched += 1
                 if score < value:
                     value = score
                     best_move = move
+                    self.pv_table[depth] = [move] + self.pv_table[depth + 1]
                 beta = min(beta, value)
-                if alpha >= beta: break
-            return value, best_move
\ No newline at end of file
+                if alpha >= beta:
+                    self.record_cutoff(move, depth, remaining_depth, move is moves[0])
+                    break
+
+        if self.aborted:
+            return value, best_move
+        if self.transposition_table is not None:
+            if value <= original_alpha:
+                bound = Bound.UPPER
+            elif value >= original_beta:
+                bound = Bound.LOWER
+            else:
+                bound = Bound.EXACT
+            self.transposition_table.store(key, remaining_depth, value, bound, best_move)
+        return value, best_move
+
+    def record_cutoff(self, move: Move, depth: int, remaining_depth: int, first_move: bool):
+        self.cutoffs += 1
+        if first_move: self.first_move_cutoffs += 1
+        if self.move_ordering is not None:
+            self.move_ordering.record_cutoff(self.game, move, depth, remaining_depth)
+
+if __name__ == "__main__":
+    # Compare the search effort with and without the transposition table and move ordering
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+    from Games.Chess import Chess
+
+    for name, make_game, depth, num_moves in (("connect4", lambda: ConnectFourBitboard(incremental_score=True), 7, 6), ("chess", Chess, 4, 4)):
+        for tt_size, move_ordering in ((0, False), (1 << 20, False), (1 << 20, True)):
+            random.seed(0)
+            game = make_game()
+            players = {player: Minimax(depth, tt_size=tt_size, move_ordering=move_ordering) for player in Player}
+            for player, model in players.items():
+                model.set_game_and_player(game, player)
+            nodes, probes, hits, interior_nodes, moves_searched = 0, 0, 0, 0, 0
+            start = time.time()
+            for _move in range(num_moves):
+                model = players[game.get_current_player()]
+                model.take_move()
+                nodes += model.stats["nodes"]
+                probes += model.stats.get("tt_probes", 0)
+                hits += model.stats.get("tt_hits", 0)
+                interior_nodes += model.interior_nodes
+                moves_searched += model.moves_searched
+            elapsed = time.time() - start
+            hit_rate = f", tt hit rate {hits / probes:.1%}" if probes > 0 else ""
+            print(f"{name} depth {depth}, tt_size {tt_size}, move_ordering {move_ordering}: {nodes} nodes in {elapsed:.2f}s, "
+                  f"branching factor {moves_searched / interior_nodes:.2f}{hit_rate}")
@@ -1,9 +1,19 @@
-
+import threading
+import time
 from abc import ABC, abstractmethod
-from Games.Game import Game, Player
+from typing import Optional
+from Games.Game import Game, Player, Move
 
 class Model(ABC):
 
+    # State of the anytime search started by start_search
+    search_thread: Optional[threading.Thread] = None
+    search_deadline: Optional[float] = None
+    stop_requested = False
+    best_move: Optional[Move] = None
+    # Exception raised by run_search on the search thread, re-raised by stop()
+    search_error: Optional[BaseException] = None
+
     @abstractmethod
     def set_game_and_player(self, game: Game, player: Player):
         # Sets up the model to play the given game as the given player
@@ -13,4 +23,65 @@ class Model(ABC):
     def take_move(self):
         # Makes a move on the game
         # This should only be called when game's current player is this model
-        pass
\ No newline at end of file
+        pass
+
+    def run_search(self):
+        # Searches the current position until search_should_stop(), keeping best_move up to date as it goes
+        # Runs on the search thread; models that support anytime search override this
+        raise NotImplementedError(f"{type(self).__name__} does not support anytime search")
+
+    def stop_pondering(self):
+        # Stops searching on the opponent's time, for models that ponder (see MCTS and AlphaMCTS)
+        # Models stop pondering themselves when it is their turn again, so this is only needed when the game ends or is abandoned
+        pass
+
+    def play_move(self, move: Move):
+        # Plays the move chosen by an anytime search
+        self.game.perform_move(move)
+
+    def start_search(self, budget: float):
+        # Starts searching the current position on a background thread, for at most budget seconds or until stop()
+        # The game must not be touched until the search is stopped
+        self.stop_pondering()
+        assert(self.game.get_current_player() == self.player)
+        assert self.search_thread is None, "A search is already running"
+        self.search_deadline = time.time() + budget
+        self.stop_requested = False
+        self.best_move = None
+        self.search_error = None
+        self.search_thread = threading.Thread(target=self.run_search_thread, daemon=True)
+        self.search_thread.start()
+
+    def run_search_thread(self):
+        try:
+            self.run_search()
+        except BaseException as error:
+            self.search_error = error
+
+    def search_should_stop(self) -> bool:
+        return self.stop_requested or time.time() >= self.search_deadline
+
+    def best_move_so_far(self) -> Optional[Move]:
+        # The move the running (or stopped) search would play now, None until it has one
+        return self.best_move
+
+    def stop(self) -> Optional[Move]:
+        # Stops the search, waits for it to finish and returns the best move it found
+        # Raises the exception the search failed with, if it did
+        if self.search_thread is not None:
+            self.stop_requested = True
+            self.search_thread.join()
+            self.search_thread = None
+        if self.search_error is not None:
+            error, self.search_error = self.search_error, None
+            raise error
+        return self.best_move_so_far()
+
+    def take_move_within(self, budget: float):
+        # Makes a move after searching for budget seconds
+        self.start_search(budget)
+        self.search_thread.join()
+        move = self.stop()
+        if move is None:
+            raise RuntimeError(f"{type(self).__name__} found no move to play within {budget} seconds")
+        self.play_move(move)
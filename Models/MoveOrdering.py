@@ -0,0 +1,94 @@
+import random
+from typing import Dict, List
+import chess
+
+from Games.Game import Game, Move
+from Games.ConnectFour import ConnectFour, ConnectFourMove, NUM_COLUMNS
+from Games.Chess import Chess, ChessMove
+
+# Orders moves so that alpha-beta search tries the most promising ones first
+# (Minimax puts the transposition table and principal variation moves before all of these)
+# Subclasses give each move a game-specific static score, and tactical (non-quiet) moves go first, best score first
+# Quiet moves follow, ordered by two heuristics learned during the search:
+# - killer moves: the last quiet moves that caused a cutoff at each depth, which often refute sibling positions too
+# - history: how often (weighted by depth) each move caused a cutoff anywhere in the tree
+# with the static score only breaking ties between them, and random numbers breaking the remaining ties
+class MoveOrdering:
+
+    NUM_KILLERS = 2
+
+    def __init__(self):
+        self.killers: Dict[int, List[Move]] = {}
+        self.history: Dict[Move, int] = {}
+
+    def new_search(self):
+        # Killers are only meaningful within one search, while history decays slowly across moves
+        self.killers = {}
+        self.history = {move: count // 2 for move, count in self.history.items() if count > 1}
+
+    def score_move(self, game: Game, move: Move) -> int:
+        # Higher scores are searched first
+        return 0
+
+    def order_moves(self, game: Game, moves: List[Move], depth: int) -> List[Move]:
+        killers = self.killers.get(depth, [])
+        def key(move: Move):
+            score = self.score_move(game, move)
+            if not self.is_quiet(score):
+                return (1, score, 0, 0, 0, random.random())
+            killer_rank = self.NUM_KILLERS - killers.index(move) if move in killers else 0
+            return (0, 0, killer_rank, self.history.get(move, 0), score, random.random())
+        return sorted(moves, key=key, reverse=True)
+
+    def is_quiet(self, score: int) -> bool:
+        # Whether a move with the given score_move is quiet
+        # Killers are only kept for quiet moves, as tactical moves are already searched early
+        return score == 0
+
+    def record_cutoff(self, game: Game, move: Move, depth: int, remaining_depth: int):
+        # Called when move caused a cutoff at depth, with remaining_depth plies left to search below it
+        if self.is_quiet(self.score_move(game, move)):
+            killers = self.killers.setdefault(depth, [])
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[self.NUM_KILLERS:]
+        self.history[move] = self.history.get(move, 0) + remaining_depth * remaining_depth
+
+class ConnectFourMoveOrdering(MoveOrdering):
+
+    def score_move(self, game: Game, move: ConnectFourMove) -> int:
+        # Center columns take part in the most windows of four
+        return -abs(move.column - NUM_COLUMNS // 2)
+
+    def is_quiet(self, score: int) -> bool:
+        # There are no captures in ConnectFour
+        return True
+
+class ChessMoveOrdering(MoveOrdering):
+
+    # Tactical moves are searched before quiet ones (which score 0), in this order
+    CAPTURE_SCORE = 1000
+    PROMOTION_SCORE = 500
+    CHECK_SCORE = 100
+
+    def score_move(self, game: Chess, move: ChessMove) -> int:
+        board = game.board
+        score = 0
+        if board.is_capture(move.move):
+            # MVV-LVA: most valuable victim first, then least valuable attacker
+            victim = board.piece_type_at(move.move.to_square) or chess.PAWN # En passant captures land on an empty square
+            attacker = board.piece_type_at(move.move.from_square)
+            score += self.CAPTURE_SCORE + 10 * victim - attacker
+        if move.move.promotion is not None:
+            score += self.PROMOTION_SCORE + move.move.promotion
+        if board.gives_check(move.move):
+            score += self.CHECK_SCORE
+        return score
+
+def make_move_ordering(game: Game) -> MoveOrdering:
+    # Returns the move ordering for the given game
+    if isinstance(game, ConnectFour):
+        return ConnectFourMoveOrdering()
+    if isinstance(game, Chess):
+        return ChessMoveOrdering()
+    return MoveOrdering()
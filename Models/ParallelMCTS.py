@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from Games.Game import Game, Player, Move
+from Models.MCTS import MCTS
+
+def search_from_root(game: Game, iterations: int, seed: int) -> Tuple[Dict[Move, Tuple[int, int]], Optional[Move]]:
+    # Grows an independent MCTS tree from the given position, stopping early if the solver proves the root
+    # Returns the (visit count, win count) of each child of the root, and the proven best move if the root was solved
+    random.seed(seed)
+    mcts = MCTS(iterations)
+    mcts.set_game_and_player(game, game.get_current_player())
+    iterations_done = 0
+    while iterations_done < iterations and mcts.root.proven is None:
+        mcts.do_iteration()
+        iterations_done += 1
+    children = {move: (child.visit_count, child.win_count) for move, child in mcts.root.children.items()}
+    solved_move = mcts.best_move_child_of_node(mcts.root).move if mcts.root.proven is not None else None
+    return children, solved_move
+
+def seeded_random_playouts(game: Game, count: int, seed: int) -> List[Optional[Player]]:
+    # Pool workers are forked with the same random state, so each task is seeded
+    random.seed(seed)
+    np.random.seed(seed)
+    return game.random_playouts(count)
+
+# MCTS that uses several CPU cores through a pool of worker processes, in one of two modes:
+# - "root": every worker grows its own tree from the current position with an equal share of iterations_per_move,
+#   and the visit counts of the root's children are summed to choose the move
+# - "leaf": a single tree is grown here, but each expanded leaf gets playouts_per_worker random playouts per worker, played out in the pool
+#   (a batch per worker, so the round trip to the pool is paid once for many playouts; see Game.random_playouts)
+# Anytime search (start_search) grows a single tree as in leaf mode, whatever the mode
+class ParallelMCTS(MCTS):
+
+    MODES = ("root", "leaf")
+
+    def __init__(self, iterations_per_move: int = 500, num_workers: Optional[int] = None, mode: str = "root", playouts_per_worker: int = 64):
+        super().__init__(iterations_per_move)
+        assert mode in self.MODES
+        self.playouts_per_worker = playouts_per_worker
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.mode = mode
+        self.pool = None
+
+    def set_game_and_player(self, game: Game, player: Player):
+        super().set_game_and_player(game, player)
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.num_workers)
+
+    def close(self):
+        # Shuts down the worker processes
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def take_move(self):
+        if self.mode == "leaf":
+            # In leaf mode, num_workers * playouts_per_worker playouts run per iteration
+            super().take_move()
+            return
+
+        assert(self.game.get_current_player() == self.player)
+        start = time.time()
+        iterations = -(-self.iterations_per_move // self.num_workers)
+        tasks = [(self.game.get_copy(), iterations, random.getrandbits(32)) for _ in range(self.num_workers)]
+        visit_counts: Dict[Move, int] = {}
+        solved_move = None
+        for children, worker_solved_move in self.pool.starmap(search_from_root, tasks):
+            for move, (visit_count, _win_count) in children.items():
+                visit_counts[move] = visit_counts.get(move, 0) + visit_count
+            solved_move = solved_move or worker_solved_move
+        self.update_stats(iterations * self.num_workers, time.time() - start)
+        # A worker that solved the position knows the best move exactly
+        best_move = solved_move if solved_move is not None else max(visit_counts, key=visit_counts.get)
+        self.game.perform_move(best_move)
+
+    def simulate(self) -> List[Optional[Player]]:
+        tasks = [(self.game, self.playouts_per_worker, random.getrandbits(32)) for _ in range(self.num_workers)]
+        return [winner for winners in self.pool.starmap(seeded_random_playouts, tasks) for winner in winners]
+
+if __name__ == "__main__":
+    # Measure how the playouts per second scale with the number of workers, against single-process MCTS
+    from Games.ConnectFourBitboard import ConnectFourBitboard
+
+    baseline = MCTS(iterations_per_move=2000)
+    baseline.set_game_and_player(ConnectFourBitboard(), Player.FIRST)
+    baseline.take_move()
+    baseline_playouts_per_second = baseline.stats["iterations_per_second"]
+    print(f"MCTS: {baseline_playouts_per_second:.0f} playouts/second")
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= os.cpu_count():
+        worker_counts.append(worker_counts[-1] * 2)
+    for mode in ParallelMCTS.MODES:
+        for num_workers in worker_counts:
+            game = ConnectFourBitboard()
+            model = ParallelMCTS(iterations_per_move=2000 if mode == "root" else 100, num_workers=num_workers, mode=mode)
+            model.set_game_and_player(game, Player.FIRST)
+            model.take_move()
+            model.close()
+            playouts_per_second = model.stats["iterations_per_second"] * (num_workers * model.playouts_per_worker if mode == "leaf" else 1)
+            print(f"{mode} mode, {num_workers} workers: {model.stats['iterations_per_second']:.0f} iterations/second, "
+                  f"{playouts_per_second:.0f} playouts/second ({playouts_per_second / baseline_playouts_per_second:.1f}x MCTS)")
@@ -17,4 +17,7 @@ class RandomModel(Model):
         assert(self.game.get_current_player() == self.player)
         moves = self.game.get_possible_moves()
         selected_move = random.choice(moves)
-        self.game.perform_move(selected_move)
\ No newline at end of file
+        self.game.perform_move(selected_move)
+
+    def run_search(self):
+        self.best_move = random.choice(self.game.get_possible_moves())
\ No newline at end of file
@@ -0,0 +1,69 @@
+from enum import Enum
+from typing import List, Optional
+from Games.Game import Move
+
+# How a stored value relates to the true minimax value of the position
+class Bound(Enum):
+    EXACT = 0 # The value is exact
+    LOWER = 1 # The search failed high: the true value is at least this value
+    UPPER = 2 # The search failed low: the true value is at most this value
+
+class TranspositionEntry:
+    __slots__ = ("key", "depth", "value", "bound", "best_move", "generation")
+
+    def __init__(self, key: int, depth: int, value: int, bound: Bound, best_move: Optional[Move], generation: int):
+        self.key = key
+        self.depth = depth # How many plies were searched below the position
+        self.value = value
+        self.bound = bound
+        self.best_move = best_move
+        self.generation = generation
+
+# A fixed-size table of search results indexed by the position hash (see Game.get_hash)
+# Memory is bounded by max_entries; when two positions map to the same slot, the replacement policy decides which one is kept:
+# - "depth": keep the deeper search, unless the stored entry is left over from an earlier move
+# - "always": always keep the newest entry
+class TranspositionTable:
+
+    REPLACEMENT_POLICIES = ("depth", "always")
+
+    def __init__(self, max_entries: int = 1 << 20, replacement: str = "depth"):
+        assert max_entries > 0
+        assert replacement in self.REPLACEMENT_POLICIES
+        self.max_entries = max_entries
+        self.replacement = replacement
+        self.entries: List[Optional[TranspositionEntry]] = [None] * max_entries
+        self.generation = 0
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes > 0 else 0.0
+
+    def new_search(self):
+        # Marks the existing entries as coming from an earlier search, so they are replaced first
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.max_entries
+
+    def probe(self, key: int) -> Optional[TranspositionEntry]:
+        self.probes += 1
+        entry = self.entries[key % self.max_entries]
+        if entry is None or entry.key != key:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, value: int, bound: Bound, best_move: Optional[Move]):
+        index = key % self.max_entries
+        entry = self.entries[index]
+        if self.replacement == "depth" and entry is not None and entry.key != key:
+            if entry.generation == self.generation and entry.depth > depth:
+                return
+        self.stores += 1
+        self.entries[index] = TranspositionEntry(key, depth, value, bound, best_move, self.generation)
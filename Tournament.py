@@ -0,0 +1,141 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from Games.Game import Player
+from GameRunner import GameRunner
+from main import GAMES, PLAYERS, make_game, make_model
+
+LATENCY_PERCENTILES = [50, 90, 99]
+
+def play_match(game_name: str, player_a: str, player_b: str, a_moves_first: bool, time_limit: Optional[float], time_control: Optional[float], seed: int) -> Dict[str, Any]:
+    """Plays one game between two players and returns its result from player A's point of view."""
+    random.seed(seed)
+    np.random.seed(seed)
+    model_a, model_b = make_model(player_a, time_limit), make_model(player_b, time_limit)
+    first, second = (model_a, model_b) if a_moves_first else (model_b, model_a)
+    try:
+        result = GameRunner(make_game(game_name), first, second, time_control).compare_once()
+    finally:
+        for model in (model_a, model_b):
+            if hasattr(model, "close"):
+                model.close()
+    a_player = Player.FIRST if a_moves_first else Player.SECOND
+    if result.winner is None:
+        outcome = "draw"
+    else:
+        outcome = "win" if result.winner == a_player else "loss"
+    a_times, b_times = result.first_player_turn_times, result.second_player_turn_times
+    if not a_moves_first:
+        a_times, b_times = b_times, a_times
+    return {
+        "seed": seed,
+        "a_moves_first": a_moves_first,
+        "outcome": outcome,
+        "moves": len(a_times) + len(b_times),
+        "total_time": result.total_time,
+        "a_move_times": a_times,
+        "b_move_times": b_times
+    }
+
+class TournamentResult:
+    def __init__(self, game_name: str, player_a: str, player_b: str, games: List[Dict[str, Any]], elapsed: float):
+        self.game_name = game_name
+        self.player_a = player_a
+        self.player_b = player_b
+        self.games = games
+        self.elapsed = elapsed
+        self.wins = sum(game["outcome"] == "win" for game in games)
+        self.draws = sum(game["outcome"] == "draw" for game in games)
+        self.losses = sum(game["outcome"] == "loss" for game in games)
+
+    def score(self) -> float:
+        """Player A's score: 1 per win and 1/2 per draw, divided by the number of games."""
+        return (self.wins + self.draws / 2) / len(self.games)
+
+    def latency_percentiles(self, key: str) -> Dict[str, float]:
+        move_times = [move_time for game in self.games for move_time in game[key]]
+        return {f"p{percentile}": float(np.percentile(move_times, percentile)) for percentile in LATENCY_PERCENTILES}
+
+    def summary(self) -> Dict[str, Any]:
+        moves = sum(game["moves"] for game in self.games)
+        return {
+            "game": self.game_name,
+            "player_a": self.player_a,
+            "player_b": self.player_b,
+            "games": len(self.games),
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "score": self.score(),
+            "a_move_time": self.latency_percentiles("a_move_times"),
+            "b_move_time": self.latency_percentiles("b_move_times"),
+            "elapsed": self.elapsed,
+            "games_per_minute": 60 * len(self.games) / self.elapsed,
+            "moves_per_second": moves / self.elapsed
+        }
+
+    def write_json(self, path: str):
+        """Writes the summary and every game's result."""
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "games": self.games}, file, indent=2)
+
+    def write_csv(self, path: str):
+        """Writes one row per game, with each player's mean and worst move time."""
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["seed", "a_moves_first", "outcome", "moves", "total_time", "a_mean_move_time", "a_max_move_time", "b_mean_move_time", "b_max_move_time"])
+            for game in self.games:
+                writer.writerow([
+                    game["seed"], game["a_moves_first"], game["outcome"], game["moves"], game["total_time"],
+                    np.mean(game["a_move_times"]), np.max(game["a_move_times"]),
+                    np.mean(game["b_move_times"]), np.max(game["b_move_times"])
+                ])
+
+def run_tournament(game_name: str, player_a: str, player_b: str, num_games: int, num_workers: Optional[int] = None, time_limit: Optional[float] = None, time_control: Optional[float] = None, seed: int = 0) -> TournamentResult:
+    """Plays num_games games between two players, alternating who moves first, spread across a pool of worker processes."""
+    assert "human" not in (player_a, player_b)
+    num_workers = num_workers if num_workers is not None else multiprocessing.cpu_count()
+    tasks = [(game_name, player_a, player_b, index % 2 == 0, time_limit, time_control, seed + index) for index in range(num_games)]
+    start = time.time()
+    if num_workers == 1:
+        games = [play_match(*task) for task in tasks]
+    else:
+        # Pool workers cannot start processes of their own
+        assert "parallel_mcts" not in (player_a, player_b), "parallel_mcts can only play tournaments with one worker"
+        with multiprocessing.Pool(num_workers) as pool:
+            games = pool.starmap(play_match, tasks)
+    return TournamentResult(game_name, player_a, player_b, games, time.time() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many games between two players and report how they compare.")
+    parser.add_argument("game", choices=GAMES, help="The game to play.")
+    parser.add_argument("player_a", choices=[player for player in PLAYERS if player != "human"], help="Player A type.")
+    parser.add_argument("player_b", choices=[player for player in PLAYERS if player != "human"], help="Player B type.")
+    parser.add_argument("--games", type=int, default=20, help="Number of games; player A moves first in every other game.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPU cores.")
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds per move for minimax (iterative deepening).")
+    parser.add_argument("--time-control", type=float, default=None, help="Seconds per move for both players, using anytime search, to compare them at equal wall-clock cost.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the first game; game i uses seed + i.")
+    parser.add_argument("--json", default=None, help="Write the summary and per-game results to this JSON file.")
+    parser.add_argument("--csv", default=None, help="Write per-game results to this CSV file.")
+
+    args = parser.parse_args()
+
+    result = run_tournament(args.game, args.player_a, args.player_b, args.games, args.workers, args.time_limit, args.time_control, args.seed)
+    summary = result.summary()
+    print(f"{args.player_a} vs {args.player_b} in {summary['games']} games: "
+          f"{result.wins} wins, {result.draws} draws, {result.losses} losses ({100 * result.score():.1f}% score)")
+    for player, key in ((args.player_a, "a_move_time"), (args.player_b, "b_move_time")):
+        percentiles = ", ".join(f"{name} {1000 * value:.1f} ms" for name, value in summary[key].items())
+        print(f"{player} move time: {percentiles}")
+    print(f"{summary['games_per_minute']:.1f} games/minute, {summary['moves_per_second']:.1f} moves/second")
+    if args.json:
+        result.write_json(args.json)
+    if args.csv:
+        result.write_csv(args.csv)
@@ -1,7 +1,8 @@
 import argparse
+from typing import Optional
 
-from Games.Game import Player
-from Games.ConnectFour import ConnectFour
+from Games.Game import Game, Player
+from Games.ConnectFourBitboard import ConnectFourBitboard
 from Games.Chess import Chess
 from GameRunner import GameRunner, GameRunnerComparisonResult
 
@@ -9,37 +10,54 @@ from Models.Model import Model
 from Models.HumanModel import HumanModel
 from Models.Minimax import Minimax
 from Models.MCTS import MCTS
+from Models.ParallelMCTS import ParallelMCTS
+from Models.ArrayMCTS import ArrayMCTS
 from Models.AlphaZero.AlphaZeroModel import AlphaZeroModel
 from Models.AlphaZero.AlphaZeroConfig import connectfour_config
 from Models.RandomModel import RandomModel
 
-def make_model(name: str) -> Model:
-    """Returns the specified model."""
+GAMES = ["connect4", "chess"]
+PLAYERS = ["human", "minimax", "mcts", "parallel_mcts", "array_mcts", "alphazero", "random"]
+
+def make_model(name: str, time_limit: Optional[float] = None) -> Model:
+    """Returns the specified model. Minimax uses iterative deepening when given a per-move time limit."""
     if name == "human":
         return HumanModel()
     if name == "random":
         return RandomModel()
     if name == "minimax":
-        return Minimax()
+        return Minimax(time_limit=time_limit)
     if name == "mcts":
         return MCTS()
+    if name == "parallel_mcts":
+        return ParallelMCTS()
+    if name == "array_mcts":
+        return ArrayMCTS()
     if name == "alphazero":
         return AlphaZeroModel(connectfour_config)
 
-def run_game(game, player1, player2):
-    """Runs the specified game with the specified players."""
+def make_game(name: str) -> Game:
+    """Returns a new game of the specified kind."""
+    if name == "connect4":
+        return ConnectFourBitboard(incremental_score=True)
+    if name == "chess":
+        return Chess()
+
+def run_game(game, player1, player2, time_limit=None, time_control=None):
+    """Runs the specified game with the specified players, each searching for time_control seconds per move if given."""
     if game == "chess" and player2 == "alphazero":
       print("AlphaZero is not yet implemented for chess")
       return
     
     print(f"Running {game} with {player1} vs {player2}")
     
-    if game == "connect4":
-        game_instance = ConnectFour()
-    elif game == "chess":
-        game_instance = Chess()
-
-    winner = GameRunner(game_instance, make_model(player1), make_model(player2)).play(show=True)
+    models = [make_model(player1, time_limit), make_model(player2, time_limit)]
+    try:
+        winner = GameRunner(make_game(game), *models, time_control).play(show=True)
+    finally:
+        for model in models:
+            if hasattr(model, "close"):
+                model.close()
     if winner == Player.FIRST:
         print(f"{player1} wins!")
     elif winner == Player.SECOND:
@@ -49,10 +67,12 @@ def run_game(game, player1, player2):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run a game with specified players.")
-    parser.add_argument("game", choices=["connect4", "chess"], help="The game to play.")
-    parser.add_argument("player1", choices=["human", "minimax", "mcts", "alphazero", "random"], help="Player 1 type.")
-    parser.add_argument("player2", choices=["human", "minimax", "mcts", "alphazero", "random"], help="Player 2 type.")
+    parser.add_argument("game", choices=GAMES, help="The game to play.")
+    parser.add_argument("player1", choices=PLAYERS, help="Player 1 type.")
+    parser.add_argument("player2", choices=PLAYERS, help="Player 2 type.")
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds per move for minimax (iterative deepening). Searches to a fixed depth if omitted.")
+    parser.add_argument("--time-control", type=float, default=None, help="Seconds per move for every player, using anytime search. Overrides each model's fixed effort.")
 
     args = parser.parse_args()
 
-    run_game(args.game, args.player1, args.player2)
\ No newline at end of file
+    run_game(args.game, args.player1, args.player2, args.time_limit, args.time_control)
\ No newline at end of file